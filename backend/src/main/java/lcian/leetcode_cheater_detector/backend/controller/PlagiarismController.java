@@ -13,6 +13,7 @@ import lombok.RequiredArgsConstructor;
 import org.springframework.data.domain.Example;
 import org.springframework.http.HttpStatus;
 import org.springframework.http.ResponseEntity;
+import org.springframework.transaction.annotation.Transactional;
 import org.springframework.web.bind.annotation.*;
 
 import java.util.ArrayList;
@@ -57,4 +58,32 @@ public class PlagiarismController {
         this.repository.saveAll(plagiarisms);
         return new ResponseEntity<>(HttpStatus.OK);
     }
+
+    // Each group replaces the groups of its detector run it shares a submission with (the ones it grew out of),
+    // so sending a group again after it grew updates it, and sending the same groups twice changes nothing.
+    @PutMapping("/plagiarisms/bulk")
+    @Transactional
+    public ResponseEntity<Void> replacePlagiarisms(@RequestBody List<PlagiarismDTO> dtos){
+        List<Plagiarism> plagiarisms = new ArrayList<>();
+        for(PlagiarismDTO dto : dtos){
+            List<Plagiarism> replaced = this.repository.findDistinctByDetectorRun_IdAndSubmissions_IdIn(
+                    dto.detectorRunId(), dto.submissionIds());
+            Plagiarism plagiarism = replaced.isEmpty()
+                    ? Plagiarism.builder().detectorRun(this.detectorRunRepository.getById(dto.detectorRunId())).build()
+                    : replaced.get(0);
+            for(int i = 1; i < replaced.size(); i++){
+                // cleared first, so removing it does not cascade to its submissions and detector run
+                Plagiarism merged = replaced.get(i);
+                merged.setSubmissions(new ArrayList<>());
+                merged.setDetectorRun(null);
+                this.repository.delete(merged);
+            }
+            plagiarism.setConfidencePercentage(dto.confidencePercentage());
+            plagiarism.setSubmissions(this.submissionRepository.findAllById(dto.submissionIds()));
+            plagiarism.setLanguage(dto.language());
+            plagiarisms.add(plagiarism);
+        }
+        this.repository.saveAll(plagiarisms);
+        return new ResponseEntity<>(HttpStatus.OK);
+    }
 }
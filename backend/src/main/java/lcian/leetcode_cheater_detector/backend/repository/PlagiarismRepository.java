@@ -3,5 +3,8 @@ package lcian.leetcode_cheater_detector.backend.repository;
 import lcian.leetcode_cheater_detector.backend.model.Plagiarism;
 import org.springframework.data.jpa.repository.JpaRepository;
 
+import java.util.List;
+
 public interface PlagiarismRepository extends JpaRepository<Plagiarism, Integer> {
+    List<Plagiarism> findDistinctByDetectorRun_IdAndSubmissions_IdIn(Integer detectorRunId, List<Integer> submissionIds);
 }
@@ -17,6 +17,8 @@ TASKS = {
     "scraping/submissions": scraping.submissions.handler,
     "scraping/questions": scraping.questions.handler,
     "processing/copydetect": processing.copydetect.handler,
+    "processing/benchmark": processing.benchmark.handler,
+    "processing/incremental": processing.incremental.handler,
 }
 
 
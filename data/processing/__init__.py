@@ -1 +1 @@
-from . import copydetect, utils
+from . import benchmark, copydetect, incremental, utils
@@ -0,0 +1 @@
+from .run import handler
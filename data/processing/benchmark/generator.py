@@ -0,0 +1,152 @@
+import random
+from typing import Dict, List, Tuple
+
+from processing.utils import SubmissionBatch
+
+# share of users writing in each language
+LANGUAGES = {"python3": 0.5, "cpp": 0.35, "java": 0.15}
+# share of users who copied their solution from a plagiarism ring
+RING_SHARE = 0.1
+RING_SIZES = (4, 12)
+
+TEMPLATES = {
+    "python3": (
+        "class Solution:\n    def solve(self, nums: List[int], k: int) -> int:\n        n = len(nums)\n{body}\n",
+        "        return {result}",
+    ),
+    "cpp": (
+        "class Solution {{\npublic:\n    long long solve(vector<int>& nums, int k) {{\n"
+        "        int n = nums.size();\n{body}\n    }}\n}};\n",
+        "        return {result};",
+    ),
+    "java": (
+        "class Solution {{\n    public long solve(int[] nums, int k) {{\n        int n = nums.length;\n{body}\n    }}\n}}\n",
+        "        return {result};",
+    ),
+}
+DECLARATIONS = {"python3": "", "cpp": "long long ", "java": "long "}
+
+# a statement is (kind, target, expression, names it reads), "let" declares target, "loop" updates it over nums
+Statement = Tuple[str, str, str, Tuple[str, ...]]
+
+
+def random_expression(r: random.Random, names: List[str]) -> Tuple[str, Tuple[str, ...]]:
+    terms, reads = [], []
+    for _ in range(r.randint(2, 5)):
+        choice = r.random()
+        if names and choice < 0.4:
+            name = r.choice(names)
+            terms.append(name)
+            reads.append(name)
+        elif choice < 0.7:
+            terms.append(f"nums[{r.randint(0, 9)}] * {r.randint(2, 99)}")
+        elif choice < 0.85:
+            terms.append(f"k * {r.randint(2, 99)}")
+        else:
+            terms.append(str(r.randint(1, 9999)))
+    expression = terms[0]
+    for term in terms[1:]:
+        expression += f" {r.choice('+-*')} {term}"
+    return expression, tuple(reads)
+
+
+def random_program(r: random.Random) -> List[Statement]:
+    names: List[str] = []
+    program = []
+    for i in range(r.randint(6, 14)):
+        if names and r.random() < 0.3:
+            target = r.choice(names)
+            program.append(("loop", target, f"nums[i] * {r.randint(2, 99)}", (target,)))
+        else:
+            expression, reads = random_expression(r, names)
+            target = f"v{i}"
+            program.append(("let", target, expression, reads))
+            names.append(target)
+    return program
+
+
+def render(program: List[Statement], language: str) -> str:
+    template, result_line = TEMPLATES[language]
+    lines = []
+    for kind, target, expression, _ in program:
+        if kind == "let":
+            end = "" if language == "python3" else ";"
+            lines.append(f"        {DECLARATIONS[language]}{target} = {expression}{end}")
+        elif language == "python3":
+            lines.append("        for i in range(n):")
+            lines.append(f"            {target} = ({target} + {expression}) % 1000000007")
+        else:
+            lines.append("        for (int i = 0; i < n; i++) {")
+            lines.append(f"            {target} = ({target} + {expression}) % 1000000007;")
+            lines.append("        }")
+    targets = [target for kind, target, _, _ in program if kind == "let"]
+    lines.append(result_line.format(result=" ^ ".join(targets[-3:])))
+    return template.format(body="\n".join(lines))
+
+
+def rename(r: random.Random, program: List[Statement]) -> List[Statement]:
+    targets = [target for kind, target, _, _ in program if kind == "let"]
+    names = {target: f"{r.choice(['a', 'b', 'c', 'res', 'tmp', 'val', 'cur'])}{i}" for i, target in enumerate(targets)}
+    renamed = []
+    for kind, target, expression, reads in program:
+        # longest names first, so v1 does not clobber the start of v12
+        for name in sorted(names, key=len, reverse=True):
+            expression = expression.replace(name, names[name].upper())
+        renamed.append((kind, names[target], expression.lower(), tuple(names[name] for name in reads)))
+    return renamed
+
+
+def reorder(r: random.Random, program: List[Statement]) -> List[Statement]:
+    program = program.copy()
+    for _ in range(r.randint(1, 3)):
+        i = r.randrange(len(program) - 1)
+        (_, first_target, _, first_reads), (_, second_target, _, second_reads) = program[i], program[i + 1]
+        # only independent neighbours are swapped, so the program still computes the same thing
+        if first_target != second_target and first_target not in second_reads and second_target not in first_reads:
+            program[i], program[i + 1] = program[i + 1], program[i]
+    return program
+
+
+def insert_dead_code(r: random.Random, program: List[Statement]) -> List[Statement]:
+    program = program.copy()
+    for j in range(r.randint(1, 2)):
+        expression, _ = random_expression(r, [])
+        program.insert(r.randint(0, len(program)), ("let", f"unused{j}", expression, ()))
+    return program
+
+
+MUTATIONS = (rename, reorder, insert_dead_code)
+
+
+def generate_contest(num_users: int, seed: int = 0) -> Tuple[SubmissionBatch, Dict[int, int]]:
+    # every user submits once, ring members submit a mutated copy of the ring's seed solution,
+    # returns the submissions and the ring of every copied submission id
+    r = random.Random(seed)
+    batch = SubmissionBatch()
+    rings: Dict[int, int] = {}
+    ring_programs: List[Tuple[List[Statement], str, int]] = []
+    copied_users = int(num_users * RING_SHARE)
+    languages, weights = list(LANGUAGES), list(LANGUAGES.values())
+    for user in range(num_users):
+        submission_id = user + 1
+        if user < copied_users:
+            if not ring_programs or ring_programs[-1][2] == 0:
+                ring_programs.append((random_program(r), r.choices(languages, weights)[0], r.randint(*RING_SIZES)))
+            program, language, remaining = ring_programs[-1]
+            ring_programs[-1] = (program, language, remaining - 1)
+            for mutation in MUTATIONS:
+                if r.random() < 0.5:
+                    program = mutation(r, program)
+            rings[submission_id] = len(ring_programs) - 1
+        else:
+            program, language = random_program(r), r.choices(languages, weights)[0]
+        batch.append(
+            id=submission_id,
+            code=render(program, language),
+            language=language,
+            date=r.randint(0, 90 * 60),
+            user_slug=f"user-{user}",
+            page=user // 25 + 1,
+            question_id=1,
+        )
+    return batch, rings
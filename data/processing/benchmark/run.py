@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+import subprocess
+import time
+import tracemalloc
+from itertools import combinations
+from typing import Any, Dict, List, Set, Tuple
+
+import httpx
+from api_client import Client
+from api_client.models.detector_run import DetectorRun
+from api_client.models.question import Question
+from dotenv import load_dotenv
+from processing.benchmark.generator import generate_contest
+from processing.copydetect import run as copydetect
+from processing.utils import SubmissionBatch
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("processing/benchmark")
+logger.setLevel(os.getenv("LOG_LEVEL") or logging.INFO)
+
+BENCHMARK_SIZES = [int(size) for size in (os.getenv("BENCHMARK_SIZES") or "1000,5000,20000,50000").split(",")]
+BENCHMARK_SEED = int(os.getenv("BENCHMARK_SEED") or 0)
+# results are printed when no path is set
+BENCHMARK_OUTPUT = os.getenv("BENCHMARK_OUTPUT")
+
+
+def stub_api_client(uploaded: List[Dict[str, Any]]) -> Client:
+    # answers every request locally and keeps the uploaded plagiarism groups
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/plagiarisms/bulk"):
+            uploaded.extend(json.loads(request.content))
+        return httpx.Response(200, json=[])
+
+    return Client(base_url="http://benchmark", httpx_args={"transport": httpx.MockTransport(handle)})
+
+
+def pairs(groups: List[Set[int]]) -> Set[Tuple[int, int]]:
+    return {pair for group in groups for pair in combinations(sorted(group), 2)}
+
+
+def run_pipeline(submissions: SubmissionBatch) -> List[Dict[str, Any]]:
+    uploaded: List[Dict[str, Any]] = []
+    copydetect.API_CLIENT = stub_api_client(uploaded)
+    question = Question(id=1, name=f"synthetic-{len(submissions)}")
+    detector_run = DetectorRun(id=1, question_id=1)
+    for language, rows in submissions.by_language().items():
+        copydetect.process_group(submissions.take(rows), language, question, detector_run)
+    return uploaded
+
+
+def benchmark(size: int) -> Dict[str, Any]:
+    logger.info(f"Benchmarking {size} submissions")
+    submissions, rings = generate_contest(size, BENCHMARK_SEED)
+    start = time.perf_counter()
+    uploaded = run_pipeline(submissions)
+    wall_time = time.perf_counter() - start
+    # memory is measured on a second run, tracing slows the first one down
+    tracemalloc.start()
+    run_pipeline(submissions)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ring_members: Dict[int, Set[int]] = {}
+    for submission_id, ring in rings.items():
+        ring_members.setdefault(ring, set()).add(submission_id)
+    expected = pairs(list(ring_members.values()))
+    found = pairs([set(plagiarism["submissionIds"]) for plagiarism in uploaded])
+    true_positives = len(expected & found)
+    return {
+        "size": size,
+        "wall_time": round(wall_time, 3),
+        "peak_memory": peak_memory,
+        "groups": len(uploaded),
+        "precision": true_positives / len(found) if found else 1.0,
+        "recall": true_positives / len(expected) if expected else 1.0,
+    }
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def handler(event, context):
+    # process_group runs without the fingerprint cache and the corpus, so every run measures the same work
+    copydetect.FINGERPRINT_CACHE_PATH = None
+    copydetect.CORPUS_DIR = None
+    results = {
+        "commit": get_commit(),
+        "seed": BENCHMARK_SEED,
+        "parameters": copydetect.recorded_parameters(),
+        "results": [benchmark(size) for size in BENCHMARK_SIZES],
+    }
+    if BENCHMARK_OUTPUT:
+        with open(BENCHMARK_OUTPUT, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Wrote results to {BENCHMARK_OUTPUT}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    handler({}, None)
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+import numpy as np
+from processing.copydetect.engine import FINGERPRINT_VERSION, NOISE_THRESHOLD, WINDOW_SIZE
+
+
+class FingerprintCache:
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # worker processes share the file, WAL lets readers go on while one of them writes
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            "code_hash BLOB, language TEXT, k INTEGER, window_size INTEGER, version INTEGER, "
+            "hashes BLOB, size INTEGER, accessed REAL, "
+            "PRIMARY KEY (code_hash, language, k, window_size, version))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS fingerprints_accessed ON fingerprints (accessed)")
+        self.connection.commit()
+
+    @staticmethod
+    def _key(code: str, language: str) -> tuple:
+        code_hash = hashlib.blake2b(code.encode(), digest_size=16).digest()
+        return (code_hash, language, NOISE_THRESHOLD, WINDOW_SIZE, FINGERPRINT_VERSION)
+
+    def get_many(self, codes: Dict[int, str], language: str) -> Dict[int, np.ndarray]:
+        keys = {submission_id: self._key(code, language) for submission_id, code in codes.items()}
+        now = time.time()
+        fingerprints = {}
+        with self.connection:
+            for submission_id, key in keys.items():
+                row = self.connection.execute(
+                    "SELECT hashes FROM fingerprints "
+                    "WHERE code_hash = ? AND language = ? AND k = ? AND window_size = ? AND version = ?",
+                    key,
+                ).fetchone()
+                if row is None:
+                    continue
+                fingerprints[submission_id] = np.frombuffer(row[0], dtype=np.uint64)
+                self.connection.execute(
+                    "UPDATE fingerprints SET accessed = ? "
+                    "WHERE code_hash = ? AND language = ? AND k = ? AND window_size = ? AND version = ?",
+                    (now, *key),
+                )
+        self.hits += len(fingerprints)
+        self.misses += len(codes) - len(fingerprints)
+        return fingerprints
+
+    def put_many(self, codes: Dict[int, str], language: str, fingerprints: Dict[int, np.ndarray]):
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (*self._key(codes[submission_id], language), hashes.tobytes(), hashes.nbytes, now)
+                    for submission_id, hashes in fingerprints.items()
+                ],
+            )
+        self.evict()
+
+    def evict(self):
+        total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM fingerprints").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+        # drop the least recently used entries until we are back at 90% of the cap
+        to_free = total_bytes - int(self.max_bytes * 0.9)
+        evicted = []
+        for rowid, size in self.connection.execute("SELECT rowid, size FROM fingerprints ORDER BY accessed"):
+            if to_free <= 0:
+                break
+            evicted.append((rowid,))
+            to_free -= size
+        with self.connection:
+            self.connection.executemany("DELETE FROM fingerprints WHERE rowid = ?", evicted)
+
+
+_cache: Optional[FingerprintCache] = None
+_cache_pid: Optional[int] = None
+
+
+def get_fingerprint_cache(path: str, max_bytes: int) -> FingerprintCache:
+    # sqlite connections must not cross a fork, so every worker process opens its own
+    global _cache, _cache_pid
+    if _cache is None or _cache_pid != os.getpid():
+        _cache = FingerprintCache(path, max_bytes)
+        _cache_pid = os.getpid()
+    return _cache
@@ -0,0 +1,207 @@
+import fcntl
+import math
+import os
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+from processing.copydetect.engine import Copied, length_compatible
+
+DOCUMENT_DTYPE = np.dtype([("submission_id", "<i8"), ("question_id", "<i8"), ("fingerprint_count", "<i8")])
+# segments are merged once this many have about the same size (the same power of it), so there are only
+# a few segments per order of magnitude and every posting is rewritten a logarithmic number of times
+SEGMENTS_PER_TIER = 4
+# postings read from each merged segment at a time
+MERGE_CHUNK = 1 << 20
+
+
+class FingerprintCorpus:
+    # Append-only fingerprint history for one language.
+    # documents.bin holds one DOCUMENT_DTYPE record per submission, every appended question adds a segment:
+    # a sorted hashes array and the matching document indices, both memory-mapped when queried and merged,
+    # and an empty file in questions/ once the segment is complete.
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.documents_path = os.path.join(directory, "documents.bin")
+        self.questions_directory = os.path.join(directory, "questions")
+
+    @contextmanager
+    def _lock(self, operation: int):
+        with open(os.path.join(self.directory, "lock"), "a") as lock:
+            fcntl.flock(lock, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _documents(self) -> np.ndarray:
+        if not os.path.exists(self.documents_path) or os.path.getsize(self.documents_path) == 0:
+            return np.zeros(0, dtype=DOCUMENT_DTYPE)
+        return np.memmap(self.documents_path, dtype=DOCUMENT_DTYPE, mode="r")
+
+    def _segments(self) -> List[str]:
+        return sorted(
+            os.path.join(self.directory, name[: -len(".hashes.npy")])
+            for name in os.listdir(self.directory)
+            if name.endswith(".hashes.npy")
+        )
+
+    def _write_segment(self, name: str, hashes: np.ndarray, documents: np.ndarray):
+        # the hashes file marks a segment as complete, so it is moved into place last
+        for suffix, array in ((".documents.npy", documents), (".hashes.npy", hashes)):
+            path = os.path.join(self.directory, name + suffix)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+
+    def _question_marker(self, question_id: int) -> str:
+        if not os.path.isdir(self.questions_directory):
+            # corpora from before the markers: the questions already in documents.bin get theirs once
+            os.makedirs(self.questions_directory + ".tmp", exist_ok=True)
+            for appended_id in np.unique(self._documents()["question_id"]).tolist():
+                open(os.path.join(self.questions_directory + ".tmp", str(appended_id)), "w").close()
+            os.replace(self.questions_directory + ".tmp", self.questions_directory)
+        return os.path.join(self.questions_directory, str(question_id))
+
+    def append(self, question_id: int, fingerprints: Dict[int, np.ndarray]):
+        with self._lock(fcntl.LOCK_EX):
+            marker = self._question_marker(question_id)
+            if os.path.exists(marker):
+                return
+            documents = self._documents()
+            first_document = len(documents)
+            records = np.zeros(len(fingerprints), dtype=DOCUMENT_DTYPE)
+            records["submission_id"] = list(fingerprints)
+            records["question_id"] = question_id
+            records["fingerprint_count"] = [len(hashes) for hashes in fingerprints.values()]
+            with open(self.documents_path, "ab") as f:
+                f.write(records.tobytes())
+            hashes = np.concatenate([np.zeros(0, dtype=np.uint64), *fingerprints.values()])
+            document_ids = np.repeat(
+                np.arange(first_document, first_document + len(fingerprints), dtype=np.int64),
+                records["fingerprint_count"],
+            )
+            order = np.argsort(hashes, kind="stable")
+            segments = self._segments()
+            next_segment = int(os.path.basename(segments[-1])) + 1 if segments else 0
+            self._write_segment(f"{next_segment:08d}", hashes[order], document_ids[order])
+            open(marker, "w").close()
+            self._compact()
+
+    def _compact(self):
+        # size-tiered: only segments of similar size are merged together, a merge can fill the next tier up
+        while True:
+            tiers: Dict[int, List[str]] = {}
+            for segment in self._segments():
+                size = np.load(segment + ".hashes.npy", mmap_mode="r").shape[0]
+                tier = int(math.log(max(size, 1), SEGMENTS_PER_TIER))
+                tiers.setdefault(tier, []).append(segment)
+            full = [segments for segments in tiers.values() if len(segments) >= SEGMENTS_PER_TIER]
+            if not full:
+                return
+            self._merge(full[0])
+
+    def _merge(self, segments: List[str]):
+        # k-way merge of the memory-mapped segments into a memory-mapped output, a chunk of hashes at a time
+        hashes = [np.load(segment + ".hashes.npy", mmap_mode="r") for segment in segments]
+        documents = [np.load(segment + ".documents.npy", mmap_mode="r") for segment in segments]
+        name = f"{int(os.path.basename(self._segments()[-1])) + 1:08d}"
+        total = sum(len(segment_hashes) for segment_hashes in hashes)
+        paths = {suffix: os.path.join(self.directory, name + suffix) for suffix in (".hashes.npy", ".documents.npy")}
+        merged_hashes = np.lib.format.open_memmap(paths[".hashes.npy"] + ".tmp", "w+", np.uint64, (total,))
+        merged_documents = np.lib.format.open_memmap(paths[".documents.npy"] + ".tmp", "w+", np.int64, (total,))
+        cursors = [0] * len(segments)
+        written = 0
+        while written < total:
+            # every segment contributes the hashes up to the smallest of their next chunk's last hash,
+            # so everything at or below it is in this step and the segment it came from moves a whole chunk
+            cutoff = min(
+                segment_hashes[min(cursor + MERGE_CHUNK, len(segment_hashes)) - 1]
+                for segment_hashes, cursor in zip(hashes, cursors)
+                if cursor < len(segment_hashes)
+            )
+            chunk_hashes, chunk_documents = [], []
+            for i, (segment_hashes, segment_documents) in enumerate(zip(hashes, documents)):
+                end = cursors[i] + int(np.searchsorted(segment_hashes[cursors[i] :], cutoff, side="right"))
+                chunk_hashes.append(np.asarray(segment_hashes[cursors[i] : end]))
+                chunk_documents.append(np.asarray(segment_documents[cursors[i] : end]))
+                cursors[i] = end
+            chunk_hashes, chunk_documents = np.concatenate(chunk_hashes), np.concatenate(chunk_documents)
+            order = np.argsort(chunk_hashes, kind="stable")
+            merged_hashes[written : written + len(order)] = chunk_hashes[order]
+            merged_documents[written : written + len(order)] = chunk_documents[order]
+            written += len(order)
+        del hashes, documents
+        # the hashes file marks a segment as complete, so it is moved into place last
+        for array, suffix in ((merged_documents, ".documents.npy"), (merged_hashes, ".hashes.npy")):
+            array.flush()
+            os.replace(paths[suffix] + ".tmp", paths[suffix])
+        for segment in segments:
+            os.remove(segment + ".hashes.npy")
+            os.remove(segment + ".documents.npy")
+
+    def query(
+        self, fingerprints: Dict[int, np.ndarray], threshold: float, question_id: int, max_document_frequency: int
+    ) -> List[Copied]:
+        submission_ids = list(fingerprints)
+        lengths = np.array([len(hashes) for hashes in fingerprints.values()], dtype=np.int64)
+        if lengths.sum() == 0:
+            return []
+        query_hashes = np.concatenate(list(fingerprints.values()))
+        query_documents = np.repeat(np.arange(len(fingerprints), dtype=np.int64), lengths)
+        order = np.argsort(query_hashes, kind="stable")
+        query_hashes, query_documents = query_hashes[order], query_documents[order]
+        unique_hashes, query_starts, query_counts = np.unique(query_hashes, return_index=True, return_counts=True)
+
+        with self._lock(fcntl.LOCK_SH):
+            segments = self._segments()
+            documents = self._documents()
+            # the document frequency cap applies to a hash's postings in all segments together,
+            # so the matches do not depend on how the segments happen to be merged
+            ranges = []
+            frequencies = np.zeros(len(unique_hashes), dtype=np.int64)
+            for segment in segments:
+                segment_hashes = np.load(segment + ".hashes.npy", mmap_mode="r")
+                # binary search only touches the pages on the search paths, plus the postings that match
+                starts = np.searchsorted(segment_hashes, unique_hashes, side="left")
+                ends = np.searchsorted(segment_hashes, unique_hashes, side="right")
+                frequencies += ends - starts
+                ranges.append((segment, starts, ends))
+            pairs = []
+            for segment, starts, ends in ranges:
+                segment_documents = np.load(segment + ".documents.npy", mmap_mode="r")
+                matched = ends > starts
+                if max_document_frequency:
+                    matched &= frequencies <= max_document_frequency
+                for i in np.flatnonzero(matched).tolist():
+                    matched_query = query_documents[query_starts[i] : query_starts[i] + query_counts[i]]
+                    matched_corpus = np.asarray(segment_documents[starts[i] : ends[i]])
+                    matched_query, matched_corpus = (
+                        np.repeat(matched_query, len(matched_corpus)),
+                        np.tile(matched_corpus, len(matched_query)),
+                    )
+                    # pairs whose fingerprint counts are too far apart can never pass the threshold
+                    compatible = length_compatible(
+                        lengths[matched_query], documents["fingerprint_count"][matched_corpus], threshold
+                    )
+                    pairs.append(matched_query[compatible] * len(documents) + matched_corpus[compatible])
+            if not pairs:
+                return []
+            pairs, shared = np.unique(np.concatenate(pairs), return_counts=True)
+            query_ids, corpus_ids = pairs // len(documents), pairs % len(documents)
+            corpus_records = documents[corpus_ids]
+
+        sim1 = shared / lengths[query_ids]
+        sim2 = shared / corpus_records["fingerprint_count"]
+        copied = np.flatnonzero(
+            (sim1 > threshold)
+            & (sim2 > threshold)
+            & (corpus_records["question_id"] != question_id)
+            & ~np.isin(corpus_records["submission_id"], submission_ids)
+        )
+        return [
+            (float(sim1[i]), float(sim2[i]), submission_ids[query_ids[i]], int(corpus_records["submission_id"][i]))
+            for i in copied.tolist()
+        ]
@@ -0,0 +1,118 @@
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from copydetect import defaults
+from copydetect.utils import winnow
+from processing.copydetect.tokenizer import tokenize
+
+# k-grams are over tokens, copydetect's 25 character noise threshold is about 14 filtered tokens
+NOISE_THRESHOLD = 14
+WINDOW_SIZE = defaults.GUARANTEE_THRESHOLD - defaults.NOISE_THRESHOLD + 1
+# bump when the fingerprint computation changes, so cached fingerprints are not reused
+FINGERPRINT_VERSION = 2
+HASH_BASE = np.uint64(0x100000001B3)
+
+# (sim1, sim2, submission_id1, submission_id2)
+Copied = Tuple[float, float, int, int]
+
+
+def hashed_kgrams(tokens: np.ndarray, k: int) -> np.ndarray:
+    # polynomial hash over the token ids, stable across processes unlike the builtin hash() copydetect uses
+    if len(tokens) < k:
+        return np.array([], dtype=np.uint64)
+    tokens = tokens.astype(np.uint64)
+    hashes = np.zeros(len(tokens) - k + 1, dtype=np.uint64)
+    for offset in range(k):
+        hashes = hashes * HASH_BASE + tokens[offset : offset + len(hashes)]
+    # splitmix64 finalizer, so that nearby k-grams do not get nearby hashes
+    hashes ^= hashes >> np.uint64(30)
+    hashes *= np.uint64(0xBF58476D1CE4E5B9)
+    hashes ^= hashes >> np.uint64(27)
+    hashes *= np.uint64(0x94D049BB133111EB)
+    hashes ^= hashes >> np.uint64(31)
+    return hashes
+
+
+def fingerprint(code: str, language: str) -> np.ndarray:
+    hashes, _ = winnow(hashed_kgrams(tokenize(code, language), NOISE_THRESHOLD), WINDOW_SIZE)
+    return hashes
+
+
+def group_duplicates(keys: Dict[int, Hashable]) -> Dict[int, List[int]]:
+    # maps the first submission with each key to all the submissions sharing it
+    groups = {}
+    for submission_id, key in keys.items():
+        groups.setdefault(key, []).append(submission_id)
+    return {submission_ids[0]: submission_ids for submission_ids in groups.values()}
+
+
+def suppress_boilerplate(
+    fingerprints: Dict[int, np.ndarray], max_frequency: float, min_documents: int = 0, min_fingerprints: int = 0
+) -> Dict[int, np.ndarray]:
+    # drops the fingerprints found in more than max_frequency of the submissions, e.g. the class/method scaffold.
+    # fingerprints shared by at most min_documents submissions are always kept, so in a small group
+    # the code a ring shares cannot pass for boilerplate.
+    # submissions left with fewer than min_fingerprints are dropped: sims over the few lines around the templates
+    # would flag two submissions that only differ in their boilerplate
+    hashes, document_frequencies = np.unique(
+        np.concatenate([np.zeros(0, dtype=np.uint64), *fingerprints.values()]), return_counts=True
+    )
+    boilerplate = hashes[document_frequencies > max(max_frequency * len(fingerprints), min_documents)]
+    kept = {
+        submission_id: hashes[~np.isin(hashes, boilerplate, assume_unique=True)]
+        for submission_id, hashes in fingerprints.items()
+    }
+    return {submission_id: hashes for submission_id, hashes in kept.items() if len(hashes) >= min_fingerprints}
+
+
+def length_compatible(lengths1: np.ndarray, lengths2: np.ndarray, threshold: float) -> np.ndarray:
+    # both sims can only pass when the shorter set, the most that can be shared, passes against the longer one,
+    # this is the same division as the final check, so it never drops a pair that check would keep
+    shorter, longer = np.minimum(lengths1, lengths2), np.maximum(lengths1, lengths2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (longer > 0) & (shorter / np.maximum(longer, 1) > threshold)
+
+
+def length_windows(sorted_lengths: np.ndarray, threshold: float) -> np.ndarray:
+    # for lengths sorted ascending, the (exclusive) end of the partners each document could pass the threshold with,
+    # slightly widened so rounding never cuts a partner off, pairs inside it still need length_compatible
+    return np.searchsorted(sorted_lengths, sorted_lengths / threshold * (1 + 1e-9), side="right")
+
+
+def length_bounded_pairs(fingerprints: Dict[int, np.ndarray], threshold: float) -> Iterator[Tuple[int, int]]:
+    # the pairs of combinations(fingerprints, 2) whose fingerprint counts are close enough to pass the threshold
+    submission_ids = list(fingerprints)
+    lengths = np.array([len(hashes) for hashes in fingerprints.values()], dtype=np.int64)
+    order = np.argsort(lengths, kind="stable")
+    sorted_lengths = lengths[order]
+    ends = length_windows(sorted_lengths, threshold)
+    for i in np.flatnonzero(sorted_lengths).tolist():
+        partners = np.arange(i + 1, ends[i])
+        partners = partners[length_compatible(sorted_lengths[i], sorted_lengths[partners], threshold)]
+        for j in order[partners].tolist():
+            first, second = sorted((order[i], j))
+            yield submission_ids[first], submission_ids[second]
+
+
+def similarity(hashes1: np.ndarray, hashes2: np.ndarray) -> Tuple[float, float]:
+    if len(hashes1) == 0 or len(hashes2) == 0:
+        return 0, 0
+    shared = len(np.intersect1d(hashes1, hashes2, assume_unique=True))
+    return shared / len(hashes1), shared / len(hashes2)
+
+
+def find_copied(
+    fingerprints: Dict[int, np.ndarray],
+    threshold: float,
+    candidates: Optional[Iterable[Tuple[int, int]]] = None,
+) -> List[Copied]:
+    if candidates is None:
+        candidates = length_bounded_pairs(fingerprints, threshold)
+    copied = []
+    for submission_id1, submission_id2 in candidates:
+        if not length_compatible(len(fingerprints[submission_id1]), len(fingerprints[submission_id2]), threshold):
+            continue
+        sim1, sim2 = similarity(fingerprints[submission_id1], fingerprints[submission_id2])
+        if sim1 > threshold and sim2 > threshold:
+            copied.append((sim1, sim2, submission_id1, submission_id2))
+    return copied
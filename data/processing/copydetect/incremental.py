@@ -0,0 +1,93 @@
+import logging
+import os
+from collections import Counter, defaultdict
+from typing import Dict, List, Set
+
+import numpy as np
+from api_client.models.detector_run import DetectorRun
+from api_client.models.plagiarism_dto import PlagiarismDTO
+from api_client.models.question import Question
+from processing.copydetect.run import PARAMETERS, get_fingerprints
+from processing.utils import SubmissionBatch, UnionFind
+
+logger = logging.getLogger("processing/copydetect")
+logger.setLevel(os.getenv("LOG_LEVEL") or logging.INFO)
+
+
+class IncrementalDetector:
+    # Keeps the fingerprint index and the plagiarism groups of one (question, language) group in memory,
+    # so submissions scraped later only need to be compared against what is already indexed.
+
+    def __init__(self, question: Question, language: str, detector_run: DetectorRun):
+        self.question = question
+        self.language = language
+        self.detector_run = detector_run
+        self.fingerprints: Dict[int, np.ndarray] = {}
+        self.postings: Dict[int, List[int]] = defaultdict(list)
+        self.users: Set[str] = set()
+        self.union_find = UnionFind([])
+        self.confidence: Dict[int, float] = defaultdict(lambda: 0)
+        # members of the groups posted so far
+        self.posted: Set[int] = set()
+
+    def add_submissions(self, submissions: SubmissionBatch) -> List[PlagiarismDTO]:
+        codes = {}
+        user_ids = submissions.column("user_ids")
+        for i in submissions.sorted_by_date(np.arange(len(submissions))).tolist():
+            user_slug = submissions.users[user_ids[i]]
+            if user_slug not in self.users:
+                codes[submissions.ids[i]] = submissions.code(i)
+                self.users.add(user_slug)
+        logger.info(f"Adding {len(codes)} submissions to {self.question.name} [{self.language}]")
+        changed_roots = set()
+        for submission_id, hashes in get_fingerprints(codes, self.language).items():
+            for other_id, sim1, sim2 in self._query(hashes):
+                self.confidence[submission_id] = max(sim1, self.confidence[submission_id])
+                self.confidence[other_id] = max(sim2, self.confidence[other_id])
+                self.union_find.add(submission_id)
+                self.union_find.add(other_id)
+                self.union_find.unite(submission_id, other_id)
+                changed_roots.add(submission_id)
+            self._index(submission_id, hashes)
+        changed_roots = {self.union_find.find(submission_id) for submission_id in changed_roots}
+        return self._changed_groups(changed_roots)
+
+    def _query(self, hashes: np.ndarray):
+        shared = Counter()
+        for hash_value in hashes.tolist():
+            posting = self.postings.get(hash_value)
+            if not posting:
+                continue
+            if PARAMETERS.MAX_DOCUMENT_FREQUENCY and len(posting) >= PARAMETERS.MAX_DOCUMENT_FREQUENCY:
+                continue
+            shared.update(posting)
+        for other_id, count in shared.items():
+            sim1, sim2 = count / len(hashes), count / len(self.fingerprints[other_id])
+            if sim1 > PARAMETERS.SIMILARITY_THRESHOLD and sim2 > PARAMETERS.SIMILARITY_THRESHOLD:
+                yield other_id, sim1, sim2
+
+    def _index(self, submission_id: int, hashes: np.ndarray):
+        self.fingerprints[submission_id] = hashes
+        for hash_value in hashes.tolist():
+            self.postings[hash_value].append(submission_id)
+
+    def _changed_groups(self, roots: Set[int]) -> List[PlagiarismDTO]:
+        # a group that grew, or joined posted groups, is posted whole again and replaces them
+        plagiarism_dtos = []
+        for root, group in self.union_find.get_groups().items():
+            if root not in roots or len(group) < PARAMETERS.GROUP_SIZE_THRESHOLD:
+                continue
+            if self.posted.isdisjoint(group):
+                logger.info(f"New group of {root} ({len(group)} submissions)")
+            else:
+                logger.info(f"Group of {root} grew to {len(group)} submissions, replacing the posted one")
+            self.posted.update(group)
+            plagiarism_dtos.append(
+                PlagiarismDTO(
+                    confidence_percentage=int(min([self.confidence[submission_id] for submission_id in group]) * 100),
+                    submission_ids=list(group),
+                    detector_run_id=int(self.detector_run.id or -1),
+                    language=self.language,
+                ),
+            )
+        return plagiarism_dtos
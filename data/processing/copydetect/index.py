@@ -0,0 +1,85 @@
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from processing.copydetect.engine import Copied, length_compatible
+
+# pairs are generated and counted about this many at a time, so a posting shared by every submission
+# (e.g. the class/method scaffold) never needs all n^2 pairs in memory at once
+PAIRS_PER_BLOCK = 1 << 22
+
+
+def shared_fingerprint_counts(
+    fingerprints: List[np.ndarray], max_document_frequency: int, threshold: float = 0
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    # yields (first, second, shared) for blocks of consecutive first documents, so every pair comes out once
+    # with its full count and in the same order as one np.unique over all of them.
+    # with a threshold, pairs whose fingerprint counts are too far apart to pass it are dropped before counting
+    # inverted index: sort every (hash, document) posting by hash, so each run of equal hashes is a posting list
+    num_documents = len(fingerprints)
+    lengths = np.array([len(hashes) for hashes in fingerprints], dtype=np.int64)
+    if lengths.sum() == 0:
+        return
+    hashes = np.concatenate(fingerprints)
+    documents = np.repeat(np.arange(num_documents, dtype=np.int64), lengths)
+    order = np.argsort(hashes, kind="stable")
+    hashes, documents = hashes[order], documents[order]
+    starts = np.flatnonzero(np.concatenate(([True], hashes[1:] != hashes[:-1])))
+    posting_lengths = np.diff(np.append(starts, len(hashes)))
+
+    # only walk postings that pair up documents, skipping the ones above the document frequency cap
+    keep = posting_lengths >= 2
+    if max_document_frequency:
+        keep &= posting_lengths <= max_document_frequency
+    starts, posting_lengths = starts[keep], posting_lengths[keep]
+    if len(starts) == 0:
+        return
+    # documents are ascending within a posting, so each entry pairs with the entries after it
+    offsets = np.cumsum(posting_lengths) - posting_lengths
+    positions = np.arange(posting_lengths.sum()) - np.repeat(offsets, posting_lengths)
+    entries = np.repeat(starts, posting_lengths) + positions
+    partners = np.repeat(posting_lengths, posting_lengths) - positions - 1
+    entry_order = np.argsort(documents[entries], kind="stable")
+    entries, partners = entries[entry_order], partners[entry_order]
+    entry_documents = documents[entries]
+
+    document_pairs = np.bincount(entry_documents, weights=partners, minlength=num_documents).astype(np.int64)
+    cumulative_pairs = np.cumsum(document_pairs)
+    block_start = 0
+    while block_start < num_documents:
+        # at least one document per block, even when it alone has more pairs than the budget
+        before = cumulative_pairs[block_start - 1] if block_start else 0
+        block_end = max(int(np.searchsorted(cumulative_pairs, before + PAIRS_PER_BLOCK, side="right")), block_start + 1)
+        low, high = np.searchsorted(entry_documents, [block_start, block_end])
+        block_start = block_end
+        block_partners = partners[low:high]
+        if block_partners.sum() == 0:
+            continue
+        first = np.repeat(entry_documents[low:high], block_partners)
+        partner_offsets = np.arange(block_partners.sum()) - np.repeat(
+            np.cumsum(block_partners) - block_partners, block_partners
+        )
+        second = documents[np.repeat(entries[low:high] + 1, block_partners) + partner_offsets]
+        if threshold:
+            compatible = length_compatible(lengths[first], lengths[second], threshold)
+            first, second = first[compatible], second[compatible]
+        pairs, counts = np.unique(first * num_documents + second, return_counts=True)
+        yield pairs // num_documents, pairs % num_documents, counts
+
+
+def find_copied_indexed(
+    fingerprints: Dict[int, np.ndarray], threshold: float, max_document_frequency: int = 0
+) -> List[Copied]:
+    submission_ids = list(fingerprints)
+    lengths = np.array([len(hashes) for hashes in fingerprints.values()])
+    copied = []
+    for first, second, shared in shared_fingerprint_counts(
+        list(fingerprints.values()), max_document_frequency, threshold
+    ):
+        sim1 = shared / lengths[first]
+        sim2 = shared / lengths[second]
+        passed = np.flatnonzero((sim1 > threshold) & (sim2 > threshold))
+        copied += [
+            (float(sim1[i]), float(sim2[i]), submission_ids[first[i]], submission_ids[second[i]])
+            for i in passed.tolist()
+        ]
+    return copied
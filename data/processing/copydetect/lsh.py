@@ -0,0 +1,37 @@
+from collections import defaultdict
+from itertools import combinations
+from typing import Dict, Set, Tuple
+
+import numpy as np
+
+SEED = 0x5EED
+
+
+def minhash_signatures(fingerprints: Dict[int, np.ndarray], num_permutations: int) -> Dict[int, np.ndarray]:
+    # h(x) = a * x + b (mod 2^64) with odd a is a permutation of the 64 bit hash space
+    rng = np.random.default_rng(SEED)
+    a = rng.integers(0, 2**63, size=num_permutations, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_permutations, dtype=np.uint64)
+    signatures = {}
+    for submission_id, hashes in fingerprints.items():
+        if len(hashes) == 0:
+            continue
+        permuted = hashes.astype(np.uint64)[:, None] * a[None, :] + b[None, :]
+        signatures[submission_id] = permuted.min(axis=0)
+    return signatures
+
+
+def lsh_candidates(fingerprints: Dict[int, np.ndarray], bands: int, rows: int) -> Set[Tuple[int, int]]:
+    signatures = minhash_signatures(fingerprints, bands * rows)
+    order = {submission_id: i for i, submission_id in enumerate(fingerprints)}
+    candidates = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for submission_id, signature in signatures.items():
+            buckets[signature[band * rows : (band + 1) * rows].tobytes()].append(submission_id)
+        for bucket in buckets.values():
+            for submission_id1, submission_id2 in combinations(bucket, 2):
+                if order[submission_id1] > order[submission_id2]:
+                    submission_id1, submission_id2 = submission_id2, submission_id1
+                candidates.add((submission_id1, submission_id2))
+    return candidates
@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import resource
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger("processing/copydetect")
+logger.setLevel(os.getenv("LOG_LEVEL") or logging.INFO)
+
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+# records of the stages running in this process right now, rss and its peak are per process,
+# so a stage that ran next to another one (prefetch, uploads) was measured together with it
+_running: Dict[int, Dict[str, Any]] = {}
+_running_lock = Lock()
+
+
+def rss_mb() -> float:
+    # resident set size right now, /proc/self/statm counts it in pages. without /proc (not Linux)
+    # this falls back to the process's high-water mark, ru_maxrss, which never goes down
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * PAGE_SIZE / 2**20, 1)
+    except OSError:
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def reset_peak_rss() -> bool:
+    # writing 5 to clear_refs resets VmHWM to the current rss (Linux 4.0+)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    # VmHWM, the high-water mark since the last reset, in kB
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class StageRecorder:
+    # Times the stages of one (question, language) group. Records are plain dicts,
+    # so a recorder filled in a worker process can be sent back to the parent with the results.
+
+    def __init__(self, question: Optional[str], language: Optional[str]):
+        self.question = question
+        self.language = language
+        self.records: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def stage(self, name: str, **counters) -> Iterator[Dict[str, Any]]:
+        # counters can also be set on the yielded record once they are known.
+        # the peak is the process's rss high-water mark, reset when the stage starts, so transient allocations
+        # freed before the stage ends still show up. peak_scope is "process" when it could not be reset.
+        # overlapped marks stages that shared the process with another one, their peaks are not theirs alone
+        record = {"question": self.question, "language": self.language, "stage": name, **counters}
+        with _running_lock:
+            record["overlapped"] = bool(_running)
+            for running in _running.values():
+                running["overlapped"] = True
+            _running[id(record)] = record
+            record["peak_scope"] = "stage" if reset_peak_rss() else "process"
+            record["rss_start_mb"] = rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 4)
+            with _running_lock:
+                del _running[id(record)]
+                record["rss_peak_mb"] = peak_rss_mb()
+            record["rss_peak_delta_mb"] = round(record["rss_peak_mb"] - record["rss_start_mb"], 1)
+            self.records.append(record)
+            logger.info(json.dumps({"metric": "stage", **record}))
+
+
+def format_summary(records: List[Dict[str, Any]], slowest_groups: int = 10) -> str:
+    stages: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    groups: Dict[tuple, float] = defaultdict(float)
+    for record in records:
+        totals = stages[record["stage"]]
+        totals["calls"] += 1
+        totals["items"] += record.get("items", 0)
+        totals["seconds"] += record["seconds"]
+        totals["max_seconds"] = max(totals["max_seconds"], record["seconds"])
+        totals["max_peak_mb"] = max(totals["max_peak_mb"], record["rss_peak_mb"])
+        totals["max_peak_delta_mb"] = max(totals["max_peak_delta_mb"], record["rss_peak_delta_mb"])
+        totals["overlapped"] += record["overlapped"]
+        groups[(record["question"], record["language"])] += record["seconds"]
+    lines = [
+        f"{'stage':<12} {'calls':>6} {'items':>10} {'seconds':>10} {'max':>9} "
+        f"{'peak mb':>9} {'peak delta mb':>14} {'overlapped':>11}"
+    ]
+    for stage, totals in sorted(stages.items(), key=lambda x: -x[1]["seconds"]):
+        lines.append(
+            f"{stage:<12} {int(totals['calls']):>6} {int(totals['items']):>10} {totals['seconds']:>10.2f} "
+            f"{totals['max_seconds']:>9.2f} {totals['max_peak_mb']:>9.1f} {totals['max_peak_delta_mb']:>14.1f} "
+            f"{int(totals['overlapped']):>11}"
+        )
+    lines.append("overlapped: calls that ran next to another stage of the same process, their peaks include it")
+    lines.append("slowest groups:")
+    for (question, language), seconds in sorted(groups.items(), key=lambda x: -x[1])[:slowest_groups]:
+        lines.append(f"  {question} [{language or '*'}] {seconds:.2f}s")
+    return "\n".join(lines)
@@ -0,0 +1,85 @@
+import logging
+import os
+from typing import Dict, List
+
+import numpy as np
+from processing.copydetect.engine import Copied, length_compatible
+from processing.copydetect.sparse import fingerprint_matrix
+
+logger = logging.getLogger("processing/copydetect")
+logger.setLevel(os.getenv("LOG_LEVEL") or logging.INFO)
+
+# candidate pairs are verified this many at a time, so the gathered rows stay small
+PAIRS_PER_BLOCK = 65536
+
+
+def minimum_overlaps(lengths: np.ndarray, threshold: float) -> np.ndarray:
+    # smallest shared count that passes the threshold against a set of each length,
+    # corrected with the same division as the final check so rounding cannot make the prefixes too short
+    safe_lengths = np.maximum(lengths, 1)
+    overlaps = np.floor(lengths * threshold).astype(np.int64) + 1
+    overlaps -= (overlaps - 1) / safe_lengths > threshold
+    overlaps += overlaps / safe_lengths <= threshold
+    return overlaps
+
+
+def find_copied_prefix(fingerprints: Dict[int, np.ndarray], threshold: float) -> List[Copied]:
+    # AllPairs-style prefix filtering: with every set ordered from its globally rarest fingerprint,
+    # two sets sharing at least o fingerprints share one within their first len - o + 1,
+    # so only those prefixes are indexed and every pair they produce is verified exactly
+    submission_ids = list(fingerprints)
+    num_documents = len(submission_ids)
+    lengths = np.array([len(hashes) for hashes in fingerprints.values()], dtype=np.int64)
+    hashes = np.concatenate([np.zeros(0, dtype=np.uint64), *fingerprints.values()])
+    _, tokens, frequencies = np.unique(hashes, return_inverse=True, return_counts=True)
+    ranks = np.empty(len(frequencies), dtype=np.int64)
+    ranks[np.argsort(frequencies, kind="stable")] = np.arange(len(frequencies))
+    tokens = ranks[tokens.ravel()]
+    documents = np.repeat(np.arange(num_documents, dtype=np.int64), lengths)
+    order = np.lexsort((tokens, documents))
+    tokens, documents = tokens[order], documents[order]
+
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if num_documents else lengths
+    positions = np.arange(len(tokens)) - np.repeat(starts, lengths)
+    prefix_lengths = lengths - minimum_overlaps(lengths, threshold) + 1
+    in_prefix = positions < np.repeat(prefix_lengths, lengths)
+    prefix_tokens, prefix_documents = tokens[in_prefix], documents[in_prefix]
+
+    order = np.argsort(prefix_tokens, kind="stable")
+    prefix_tokens, prefix_documents = prefix_tokens[order], prefix_documents[order]
+    posting_starts = np.flatnonzero(np.concatenate(([True], prefix_tokens[1:] != prefix_tokens[:-1])))
+    posting_lengths = np.diff(np.append(posting_starts, len(prefix_tokens)))
+    generated = 0
+    pairs = [np.zeros(0, dtype=np.int64)]
+    for start, length in zip(posting_starts.tolist(), posting_lengths.tolist()):
+        if length < 2:
+            continue
+        posting = prefix_documents[start : start + length]
+        first, second = np.triu_indices(length, k=1)
+        first, second = posting[first], posting[second]
+        generated += len(first)
+        compatible = length_compatible(lengths[first], lengths[second], threshold)
+        pairs.append(first[compatible] * num_documents + second[compatible])
+    candidates = np.unique(np.concatenate(pairs))
+
+    matrix = fingerprint_matrix(list(fingerprints.values()))
+    copied = []
+    for block in range(0, len(candidates), PAIRS_PER_BLOCK):
+        first = candidates[block : block + PAIRS_PER_BLOCK] // num_documents
+        second = candidates[block : block + PAIRS_PER_BLOCK] % num_documents
+        shared = np.asarray(matrix[first].multiply(matrix[second]).sum(axis=1)).ravel()
+        sim1 = shared / lengths[first]
+        sim2 = shared / lengths[second]
+        passed = np.flatnonzero((sim1 > threshold) & (sim2 > threshold))
+        copied += zip(
+            sim1[passed].tolist(),
+            sim2[passed].tolist(),
+            [submission_ids[i] for i in first[passed].tolist()],
+            [submission_ids[i] for i in second[passed].tolist()],
+        )
+    logger.info(
+        f"Prefix filter: indexed {len(prefix_tokens)} of {len(tokens)} fingerprints, "
+        f"{generated} prefix pairs, {len(candidates)} candidates after the length bound, {len(copied)} copied "
+        f"(out of {num_documents * (num_documents - 1) // 2} pairs)"
+    )
+    return copied
@@ -1,28 +1,51 @@
+import hashlib
 import json
 import logging
 import math
+import multiprocessing
 import os
-import tempfile
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from threading import Event, Thread
 from types import SimpleNamespace
-from typing import List, Optional
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import boto3
-import copydetect
+import numpy as np
 from api_client import Client
 from api_client.api.detector_run_controller import add_detector_run
-from api_client.api.plagiarism_controller import add_plagiarisms
 from api_client.api.question_controller import get_questions_by_contest
-from api_client.api.submission_controller import get_submissions_1
 from api_client.models.detector_run import DetectorRun
 from api_client.models.detector_run_dto import DetectorRunDTO
 from api_client.models.plagiarism_dto import PlagiarismDTO
 from api_client.models.question import Question
-from api_client.models.submission import Submission
 from api_client.types import Response
 from dotenv import load_dotenv
-from processing.utils import UnionFind
+from processing.copydetect.cache import get_fingerprint_cache
+from processing.copydetect.corpus import FingerprintCorpus
+from processing.copydetect.engine import (
+    FINGERPRINT_VERSION,
+    Copied,
+    find_copied,
+    fingerprint,
+    group_duplicates,
+    suppress_boilerplate,
+)
+from processing.copydetect.index import find_copied_indexed
+from processing.copydetect.lsh import lsh_candidates
+from processing.copydetect.metrics import StageRecorder, format_summary
+from processing.copydetect.prefix import find_copied_prefix
+from processing.copydetect.sparse import find_copied_sparse
+from processing.copydetect.upload import PlagiarismUploader
+from processing.utils import ArrayUnionFind, SubmissionBatch, iter_json_array
 
 load_dotenv()
 
@@ -31,16 +54,75 @@ logger = logging.getLogger("processing/copydetect")
 logger.setLevel(os.getenv("LOG_LEVEL") or logging.INFO)
 
 DETECTOR_NAME = "copydetect"
-PARAMETERS = SimpleNamespace(**{"GROUP_SIZE_THRESHOLD": 4, "SIMILARITY_THRESHOLD": 0.8})
+PARAMETERS = SimpleNamespace(
+    **{
+        "GROUP_SIZE_THRESHOLD": 4,
+        "SIMILARITY_THRESHOLD": 0.8,
+        # "sparse" multiplies the sparse submission x fingerprint matrix with its transpose,
+        # "index" walks an inverted fingerprint index, "prefix" only indexes the rarest fingerprints of every submission
+        # and verifies the pairs they share (same pairs as "dense"), "dense" scores every pair (or the LSH candidates)
+        "SIMILARITY_BACKEND": os.getenv("SIMILARITY_BACKEND") or "sparse",
+        # fingerprints found in more than this share of a group's distinct submissions are dropped before comparing
+        # (0 disables it), exact copies of a leaked solution only count once towards the share
+        "BOILERPLATE_FREQUENCY": float(os.getenv("BOILERPLATE_FREQUENCY") or 0),
+        # but never the fingerprints shared by this many distinct submissions or fewer, whatever their share
+        "BOILERPLATE_MIN_DOCUMENTS": int(os.getenv("BOILERPLATE_MIN_DOCUMENTS") or 20),
+        # submissions with fewer fingerprints left once the boilerplate is dropped are not compared
+        "BOILERPLATE_MIN_FINGERPRINTS": int(os.getenv("BOILERPLATE_MIN_FINGERPRINTS") or 10),
+        # fingerprints shared by more submissions are skipped by the "sparse" and "index" backends, 0 disables the cap
+        "MAX_DOCUMENT_FREQUENCY": int(os.getenv("MAX_DOCUMENT_FREQUENCY") or 0),
+        "CROSS_CONTEST": bool(os.getenv("CORPUS_DIR")),
+        # fingerprints shared by more previous submissions are ignored when querying the corpus, 0 disables the cap
+        "CORPUS_MAX_DOCUMENT_FREQUENCY": int(os.getenv("CORPUS_MAX_DOCUMENT_FREQUENCY") or 1000),
+        # MinHash/LSH candidate generation, disabled when either is 0
+        "LSH_BANDS": int(os.getenv("LSH_BANDS") or 0),
+        "LSH_ROWS": int(os.getenv("LSH_ROWS") or 0),
+    }
+)
+
+# parameters only some backends use, the others warn about them and leave them out of the recorded parameters
+BACKEND_PARAMETERS = {
+    "LSH_BANDS": ["dense"],
+    "LSH_ROWS": ["dense"],
+    "MAX_DOCUMENT_FREQUENCY": ["sparse", "index"],
+}
+for name, backends in BACKEND_PARAMETERS.items():
+    if getattr(PARAMETERS, name) and PARAMETERS.SIMILARITY_BACKEND not in backends:
+        logger.warning(f"{name} is ignored by the {PARAMETERS.SIMILARITY_BACKEND} backend, only {backends} use it")
+
+NUM_WORKERS = int(os.getenv("NUM_WORKERS") or 1)
+# with workers, fetching stops while more (question, language) groups than this wait for their results,
+# each waiting group keeps its submissions in the parent
+MAX_PENDING_GROUPS = 2 * NUM_WORKERS
+# number of questions whose submissions are fetched in the background ahead of the one being processed, 0 disables it
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH") or 1)
+# submissions are only compared against previous contests when a corpus directory is set
+CORPUS_DIR = os.getenv("CORPUS_DIR")
+# fingerprints are only cached when a path is set
+FINGERPRINT_CACHE_PATH = os.getenv("FINGERPRINT_CACHE_PATH")
+FINGERPRINT_CACHE_MAX_BYTES = int(os.getenv("FINGERPRINT_CACHE_MAX_BYTES") or 1 << 30)
 
 API_CLIENT = Client(base_url=str(os.getenv("API_BASE_URL")))
+# submissions are streamed from the same endpoint as get_submissions_1, which can only read the whole body
+SUBMISSIONS_BULK_PATH = "/api/v1/submissions/bulk"
+
+# stage timings of the current contest, from this process and the workers
+STAGE_RECORDERS: List[StageRecorder] = []
+
+
+def recorded_parameters() -> Dict:
+    return {
+        name: value
+        for name, value in PARAMETERS.__dict__.items()
+        if PARAMETERS.SIMILARITY_BACKEND in BACKEND_PARAMETERS.get(name, [PARAMETERS.SIMILARITY_BACKEND])
+    }
 
 
 def create_detector_run(question: Question, reference_submission_id: Optional[int]) -> DetectorRun:
     assert question.id
     detector_run_dto = DetectorRunDTO(
         detector=DETECTOR_NAME,
-        parameters=str(PARAMETERS.__dict__)[1:-1],
+        parameters=str(recorded_parameters())[1:-1],
         question_id=int(question.id),
     )
     if reference_submission_id:
@@ -50,105 +132,309 @@ def create_detector_run(question: Question, reference_submission_id: Optional[in
     return DetectorRun.from_dict(detector_run)
 
 
-def process_group(
-    submissions: List[Submission],
+def get_fingerprints(codes: Dict[int, str], language: str) -> Dict[int, np.ndarray]:
+    if not FINGERPRINT_CACHE_PATH:
+        return {submission_id: fingerprint(code, language) for submission_id, code in codes.items()}
+    cache = get_fingerprint_cache(FINGERPRINT_CACHE_PATH, FINGERPRINT_CACHE_MAX_BYTES)
+    cached = cache.get_many(codes, language)
+    computed = {
+        submission_id: fingerprint(code, language)
+        for submission_id, code in codes.items()
+        if submission_id not in cached
+    }
+    cache.put_many(codes, language, computed)
+    logger.info(f"Fingerprint cache: {len(cached)} hits, {len(computed)} misses")
+    return {submission_id: cached.get(submission_id, computed.get(submission_id)) for submission_id in codes}
+
+
+def build_plagiarism_dtos(copied: List[Copied], language: str, detector_run: DetectorRun) -> List[PlagiarismDTO]:
+    copied_submissions = [sub1 for _, _, sub1, _ in copied] + [sub2 for _, _, _, sub2 in copied]
+    union_find = ArrayUnionFind(copied_submissions)
+    confidence = defaultdict(lambda: 0)
+    for sim1, sim2, sub1, sub2 in copied:
+        confidence[sub1] = max(sim1, confidence[sub1])
+        confidence[sub2] = max(sim2, confidence[sub2])
+    union_find.unite_many((sub1, sub2) for _, _, sub1, sub2 in copied)
+    groups = union_find.get_groups()
+    logger.info(f"Found {len(groups)} plagiarism groups")
+    plagiarism_dtos = []
+    i = 0
+    for reference_submission_id, group in groups.items():
+        if len(group) < PARAMETERS.GROUP_SIZE_THRESHOLD:
+            logger.info(f"Skipping group {i} ({len(group)} < {PARAMETERS.GROUP_SIZE_THRESHOLD} submissions)")
+            i += 1
+            continue
+        logger.info(f"Adding group {i} ({len(group)} submissions)")
+        plagiarism_dtos.append(
+            PlagiarismDTO(
+                confidence_percentage=int(min([confidence[submission_id] for submission_id in group]) * 100),
+                submission_ids=list(group),
+                detector_run_id=int(detector_run.id or -1),
+                language=language,
+            ),
+        )
+        i += 1
+    return plagiarism_dtos
+
+
+def find_plagiarisms(
+    submissions: SubmissionBatch,
     language: str,
     question: Question,
     detector_run: DetectorRun,
-):
-    if len(submissions) < PARAMETERS.GROUP_SIZE_THRESHOLD:
+    recorder: Optional[StageRecorder] = None,
+) -> Optional[List[PlagiarismDTO]]:
+    recorder = recorder or StageRecorder(question.name, language)
+    # a smaller group cannot be a plagiarism group on its own, but with a corpus it still goes into the history
+    # and can match previous contests
+    if len(submissions) < PARAMETERS.GROUP_SIZE_THRESHOLD and not CORPUS_DIR:
         logger.info(
             f"Skipping {question.name} [{language}] ({len(submissions)} < {PARAMETERS.GROUP_SIZE_THRESHOLD} submissions)"
         )
-        return
+        return None
     logger.info(f"Processing {question.name} [{language}] ({len(submissions)} submissions)")
-    submissions.sort(key=lambda x: x.date)
-    submission_id_to_submission = {submission.id: submission for submission in submissions}
-    added_users = set()
-    plagiarism_dtos = []
-    cwd = os.getcwd()
-    with tempfile.TemporaryDirectory() as tmpdir:
-        os.chdir(tmpdir)
-        for submission in submissions:
-            if submission.user_slug not in added_users:
-                with open(f"{submission.id}.txt", "w") as f:
-                    f.write(submission.code)
-                added_users.add(submission.user_slug)
-
-        detector = copydetect.CopyDetector(
-            test_dirs=[tmpdir],
-            extensions=[".txt"],
-            force_language=language,
-            silent=True,
+    with recorder.stage("dedupe", items=len(submissions)) as record:
+        rows = submissions.sorted_by_date(np.arange(len(submissions)))
+        rows = submissions.first_per_user(rows)
+        codes = {submissions.ids[i]: submissions.code(i) for i in rows.tolist()}
+
+        # byte-identical submissions are only fingerprinted once, then submissions with identical fingerprints
+        # (same code up to whitespace, comments and names) are only compared once, since they would score 1.0
+        duplicates = group_duplicates(
+            {
+                submission_id: hashlib.blake2b(code.encode(), digest_size=16).digest()
+                for submission_id, code in codes.items()
+            }
         )
-        detector.run()
-        copied = detector.get_copied_code_list()
-        copied = [
-            (sim1, sim2, file1, file2, _, _, _)
-            for sim1, sim2, file1, file2, _, _, _ in copied
-            if sim1 > PARAMETERS.SIMILARITY_THRESHOLD and sim2 > PARAMETERS.SIMILARITY_THRESHOLD
-        ]
-        copied_submissions = [int(file1.split("/")[-1].split(".")[0]) for _, _, file1, file2, _, _, _ in copied] + [
-            int(file2.split("/")[-1].split(".")[0]) for _, _, file1, file2, _, _, _ in copied
+        record["kept"] = len(duplicates)
+    with recorder.stage("fingerprint", items=len(duplicates)):
+        fingerprints = get_fingerprints({submission_id: codes[submission_id] for submission_id in duplicates}, language)
+    fingerprint_duplicates = group_duplicates(
+        {
+            submission_id: hashes.tobytes() if len(hashes) else submission_id
+            for submission_id, hashes in fingerprints.items()
+        }
+    )
+    duplicates = {
+        representative_id: [
+            submission_id for duplicate_id in duplicate_ids for submission_id in duplicates[duplicate_id]
         ]
-        union_find = UnionFind(copied_submissions)
-        confidence = defaultdict(lambda: 0)
-        for sim1, sim2, file1, file2, _, _, _ in copied:
-            sub1 = int(file1.split("/")[-1].split(".")[0])
-            sub2 = int(file2.split("/")[-1].split(".")[0])
-            confidence[sub1] = max(sim1, confidence[sub1])
-            confidence[sub2] = max(sim2, confidence[sub2])
-            union_find.unite(sub1, sub2)
-        groups = union_find.get_groups()
-        logger.info(f"Found {len(groups)} plagiarism groups")
-        i = 0
-        for reference_submission_id, group in groups.items():
-            plagiarism_submissions = [submission_id_to_submission[submission_id] for submission_id in group]
-            if len(group) < PARAMETERS.GROUP_SIZE_THRESHOLD:
-                logger.info(f"Skipping group {i} ({len(group)} < {PARAMETERS.GROUP_SIZE_THRESHOLD} submissions)")
-                i += 1
-                continue
-            logger.info(f"Adding group {i} ({len(group)} submissions)")
-            plagiarism_dtos.append(
-                PlagiarismDTO(
-                    confidence_percentage=int(
-                        min([confidence[submission.id] for submission in plagiarism_submissions]) * 100
-                    ),
-                    submission_ids=[submission.id for submission in plagiarism_submissions],
-                    detector_run_id=int(detector_run.id or -1),
-                    language=language,
-                ),
+        for representative_id, duplicate_ids in fingerprint_duplicates.items()
+    }
+    fingerprints = {representative_id: fingerprints[representative_id] for representative_id in duplicates}
+    logger.info(f"Comparing {len(fingerprints)} distinct submissions out of {len(codes)}")
+    compared_fingerprints = fingerprints
+    if PARAMETERS.BOILERPLATE_FREQUENCY:
+        with recorder.stage("boilerplate", items=len(fingerprints)) as record:
+            compared_fingerprints = suppress_boilerplate(
+                fingerprints,
+                PARAMETERS.BOILERPLATE_FREQUENCY,
+                PARAMETERS.BOILERPLATE_MIN_DOCUMENTS,
+                PARAMETERS.BOILERPLATE_MIN_FINGERPRINTS,
             )
-            i += 1
-    add_plagiarisms.sync_detailed(client=API_CLIENT, body=plagiarism_dtos)
-    os.chdir(cwd)
+            kept = sum(len(hashes) for hashes in compared_fingerprints.values())
+            total = sum(len(hashes) for hashes in fingerprints.values())
+            record["suppressed"] = total - kept
+            record["dropped"] = len(fingerprints) - len(compared_fingerprints)
+        logger.info(
+            f"Suppressed {total - kept} of {total} fingerprints as boilerplate, "
+            f"{len(fingerprints) - len(compared_fingerprints)} submissions had too few left to compare"
+        )
 
+    with recorder.stage("compare", items=len(compared_fingerprints)) as record:
+        if PARAMETERS.SIMILARITY_BACKEND == "sparse":
+            copied = find_copied_sparse(
+                compared_fingerprints, PARAMETERS.SIMILARITY_THRESHOLD, PARAMETERS.MAX_DOCUMENT_FREQUENCY
+            )
+        elif PARAMETERS.SIMILARITY_BACKEND == "prefix":
+            copied = find_copied_prefix(compared_fingerprints, PARAMETERS.SIMILARITY_THRESHOLD)
+        elif PARAMETERS.SIMILARITY_BACKEND == "index":
+            copied = find_copied_indexed(
+                compared_fingerprints, PARAMETERS.SIMILARITY_THRESHOLD, PARAMETERS.MAX_DOCUMENT_FREQUENCY
+            )
+        else:
+            candidates = None
+            if PARAMETERS.LSH_BANDS and PARAMETERS.LSH_ROWS:
+                candidates = lsh_candidates(compared_fingerprints, PARAMETERS.LSH_BANDS, PARAMETERS.LSH_ROWS)
+                logger.info(f"Found {len(candidates)} LSH candidate pairs")
+            copied = find_copied(compared_fingerprints, PARAMETERS.SIMILARITY_THRESHOLD, candidates)
+        record["pairs"] = len(copied)
+    for representative_id, submission_ids in duplicates.items():
+        if len(fingerprints[representative_id]):
+            copied += [(1.0, 1.0, representative_id, submission_id) for submission_id in submission_ids[1:]]
+    with recorder.stage("cluster", items=len(copied)) as record:
+        plagiarism_dtos = build_plagiarism_dtos(copied, language, detector_run)
+        record["groups"] = len(plagiarism_dtos)
+
+    if CORPUS_DIR:
+        with recorder.stage("corpus", items=len(fingerprints)) as record:
+            corpus = FingerprintCorpus(os.path.join(CORPUS_DIR, f"v{FINGERPRINT_VERSION}", language))
+            historical_copied = corpus.query(
+                fingerprints,
+                PARAMETERS.SIMILARITY_THRESHOLD,
+                int(question.id or -1),
+                PARAMETERS.CORPUS_MAX_DOCUMENT_FREQUENCY,
+            )
+            historical_copied = [
+                (sim1, sim2, submission_id, historical_id)
+                for sim1, sim2, representative_id, historical_id in historical_copied
+                for submission_id in duplicates[representative_id]
+            ]
+            logger.info(f"Found {len(historical_copied)} matches with previous contests")
+            plagiarism_dtos += build_plagiarism_dtos(historical_copied, language, detector_run)
+            corpus.append(
+                int(question.id or -1),
+                {
+                    submission_id: fingerprints[representative_id]
+                    for representative_id, submission_ids in duplicates.items()
+                    for submission_id in submission_ids
+                },
+            )
+            record["pairs"] = len(historical_copied)
+    return plagiarism_dtos
 
-def process_question(question: Question, submissions: List[Submission]):
+
+def process_group(
+    submissions: SubmissionBatch,
+    language: str,
+    question: Question,
+    detector_run: DetectorRun,
+    uploader: Optional[PlagiarismUploader] = None,
+):
+    # without a shared uploader the groups are uploaded before returning
+    recorder = StageRecorder(question.name, language)
+    STAGE_RECORDERS.append(recorder)
+    plagiarism_dtos = find_plagiarisms(submissions, language, question, detector_run, recorder)
+    if plagiarism_dtos is None:
+        return
+    if uploader is None:
+        group_uploader = PlagiarismUploader(API_CLIENT)
+        group_uploader.submit(plagiarism_dtos, recorder)
+        upload_summary = group_uploader.close()
+        if upload_summary["failed_chunks"]:
+            raise RuntimeError(f"Could not upload {upload_summary['failed_groups']} plagiarism groups")
+    else:
+        uploader.submit(plagiarism_dtos, recorder)
+
+
+def detect_group(
+    submissions: SubmissionBatch,
+    language: str,
+    question: Question,
+    detector_run: DetectorRun,
+) -> Tuple[Optional[List[Dict]], StageRecorder]:
+    # runs in a worker process, the recorder goes back with the results so the parent can add the upload.
+    # groups are sent back as dicts, since an unpickled UNSET is no longer the parent's UNSET and to_dict would send it
+    recorder = StageRecorder(question.name, language)
+    plagiarism_dtos = find_plagiarisms(submissions, language, question, detector_run, recorder)
+    if plagiarism_dtos is None:
+        return None, recorder
+    return [plagiarism_dto.to_dict() for plagiarism_dto in plagiarism_dtos], recorder
+
+
+def process_question(
+    question: Question,
+    submissions: SubmissionBatch,
+    executor: Optional[Executor] = None,
+    uploader: Optional[PlagiarismUploader] = None,
+) -> List["Future[Tuple[Optional[List[Dict]], StageRecorder]]"]:
     logger.info(f"Processing question {question.name}")
-    lang_submissions = defaultdict(list)
-    for submission in submissions:
-        lang_submissions[submission.language].append(submission)
+    lang_submissions = {lang: submissions.take(rows) for lang, rows in submissions.by_language().items()}
     detector_run = create_detector_run(question, None)
-    for lang in lang_submissions:
-        process_group(lang_submissions[lang], lang, question, detector_run)
+    if executor is None:
+        for lang in lang_submissions:
+            process_group(lang_submissions[lang], lang, question, detector_run, uploader)
+        return []
+    # groups are detected in the worker processes, the caller uploads the results
+    return [
+        executor.submit(detect_group, lang_submissions[lang], lang, question, detector_run) for lang in lang_submissions
+    ]
 
 
-def process_contest(contest_slug: str):
-    logger.info(f"Processing contest {contest_slug}")
+def get_submissions(question: Question) -> SubmissionBatch:
+    assert question.id, "Fetched question must have an id"
+    # the body is decoded while it streams in and every submission goes straight into the columns,
+    # so neither the raw bytes nor per-submission objects exist all at once
+    with API_CLIENT.get_httpx_client().stream(
+        "GET", SUBMISSIONS_BULK_PATH, params={"questionId": question.id}
+    ) as response:
+        response.raise_for_status()
+        return SubmissionBatch.from_dicts(iter_json_array(response.iter_text()))
+
+
+def fetch_submissions(question: Question) -> SubmissionBatch:
+    recorder = StageRecorder(question.name, None)
+    with recorder.stage("fetch") as record:
+        submissions = get_submissions(question)
+        record["items"] = len(submissions)
+    STAGE_RECORDERS.append(recorder)
+    return submissions
+
+
+def prefetch_submissions(questions: List[Question], depth: int) -> Iterator[Tuple[Question, SubmissionBatch]]:
+    if depth <= 0:
+        for question in questions:
+            yield question, fetch_submissions(question)
+        return
+    with ThreadPoolExecutor(max_workers=depth, thread_name_prefix="prefetch") as executor:
+        pending: Deque[Tuple[Question, "Future[SubmissionBatch]"]] = deque()
+        for question in questions:
+            pending.append((question, executor.submit(fetch_submissions, question)))
+            if len(pending) > depth:
+                question, future = pending.popleft()
+                yield question, future.result()
+        while pending:
+            question, future = pending.popleft()
+            yield question, future.result()
+
+
+def get_questions(contest_slug: str) -> List[Question]:
     questions_response: Response[List[Question]] = get_questions_by_contest.sync_detailed(
         client=API_CLIENT, contest_slug=contest_slug
     )
     questions = json.loads(questions_response.content.decode())
-    questions = [Question.from_dict(question) for question in questions]
-    for question in questions:
-        assert question.id, "Fetched question must have an id"
-        submissions_response: Response[List[Submission]] = get_submissions_1.sync_detailed(
-            client=API_CLIENT, question_id=question.id
-        )
-        submissions = json.loads(submissions_response.content.decode())
-        submissions = [Submission.from_dict(submission) for submission in submissions]
-        process_question(question, submissions)
+    return [Question.from_dict(question) for question in questions]
+
+
+def upload_results(
+    futures: Iterable["Future[Tuple[Optional[List[Dict]], StageRecorder]]"], uploader: PlagiarismUploader
+):
+    for future in futures:
+        plagiarisms, recorder = future.result()
+        STAGE_RECORDERS.append(recorder)
+        if plagiarisms is not None:
+            uploader.submit([PlagiarismDTO.from_dict(plagiarism) for plagiarism in plagiarisms], recorder)
+
+
+def process_contest(contest_slug: str):
+    logger.info(f"Processing contest {contest_slug}")
+    questions = get_questions(contest_slug)
+    STAGE_RECORDERS.clear()
+    # uploads run in the background while the next groups are detected
+    uploader = PlagiarismUploader(API_CLIENT)
+    if NUM_WORKERS <= 1:
+        for question, submissions in prefetch_submissions(questions, PREFETCH_DEPTH):
+            process_question(question, submissions, uploader=uploader)
+    else:
+        # workers are started from a fresh forkserver process, forking this one would copy the prefetch,
+        # upload and heartbeat threads' state (locks, half-read responses) into every worker
+        with ProcessPoolExecutor(
+            max_workers=NUM_WORKERS, mp_context=multiprocessing.get_context("forkserver")
+        ) as executor:
+            pending: Set[Future] = set()
+            for question, submissions in prefetch_submissions(questions, PREFETCH_DEPTH):
+                pending.update(process_question(question, submissions, executor))
+                done, pending = wait(pending, timeout=0)
+                upload_results(done, uploader)
+                while len(pending) > MAX_PENDING_GROUPS:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    upload_results(done, uploader)
+            upload_results(as_completed(pending), uploader)
+    upload_summary = uploader.close()
+    records = [record for recorder in STAGE_RECORDERS for record in recorder.records]
+    logger.info(f"Stage summary for {contest_slug}:\n{format_summary(records)}")
+    if upload_summary["failed_chunks"]:
+        raise RuntimeError(f"Could not upload {upload_summary['failed_groups']} plagiarism groups")
 
 
 def setup_heartbeat():
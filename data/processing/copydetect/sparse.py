@@ -0,0 +1,62 @@
+from typing import Dict, List
+
+import numpy as np
+import scipy.sparse
+from processing.copydetect.engine import Copied, length_windows
+
+ROWS_PER_BLOCK = 2048
+
+
+def fingerprint_matrix(fingerprints: List[np.ndarray], max_document_frequency: int = 0) -> scipy.sparse.csr_matrix:
+    # one binary row per submission, one column per distinct fingerprint hash
+    lengths = np.array([len(hashes) for hashes in fingerprints], dtype=np.int64)
+    hashes = np.concatenate([np.zeros(0, dtype=np.uint64), *fingerprints])
+    _, columns, document_frequencies = np.unique(hashes, return_inverse=True, return_counts=True)
+    rows = np.repeat(np.arange(len(fingerprints), dtype=np.int64), lengths)
+    if max_document_frequency:
+        kept = document_frequencies[columns] <= max_document_frequency
+        rows, columns = rows[kept], columns[kept]
+    return scipy.sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, columns)),
+        shape=(len(fingerprints), len(document_frequencies)),
+    )
+
+
+def find_copied_sparse(
+    fingerprints: Dict[int, np.ndarray], threshold: float, max_document_frequency: int = 0
+) -> List[Copied]:
+    # rows are sorted by fingerprint count, so each block only has to be multiplied with the following rows
+    # whose counts are close enough to pass the threshold
+    lengths = np.array([len(hashes) for hashes in fingerprints.values()], dtype=np.int64)
+    order = np.argsort(lengths, kind="stable")
+    ids = list(fingerprints)
+    submission_ids = [ids[i] for i in order.tolist()]
+    lengths = lengths[order]
+    ends = length_windows(lengths, threshold)
+    values = list(fingerprints.values())
+    matrix = fingerprint_matrix([values[i] for i in order.tolist()], max_document_frequency)
+    copied = []
+    # the product is computed a block of rows at a time, so the shared counts never need n^2 memory
+    for start in range(0, len(submission_ids), ROWS_PER_BLOCK):
+        stop = min(start + ROWS_PER_BLOCK, len(submission_ids))
+        end = ends[stop - 1]
+        if end <= start + 1:
+            continue
+        shared = scipy.sparse.triu(matrix[start:stop] @ matrix[start:end].T, k=1).tocoo()
+        first, second = shared.row + start, shared.col + start
+        sim1 = shared.data / lengths[first]
+        sim2 = shared.data / lengths[second]
+        passed = np.flatnonzero((sim1 > threshold) & (sim2 > threshold))
+        # pairs are reported in the submissions' original order
+        swapped = order[first[passed]] > order[second[passed]]
+        first, second = first[passed], second[passed]
+        sim1, sim2 = sim1[passed], sim2[passed]
+        first, second = np.where(swapped, second, first), np.where(swapped, first, second)
+        sim1, sim2 = np.where(swapped, sim2, sim1), np.where(swapped, sim1, sim2)
+        copied += zip(
+            sim1.tolist(),
+            sim2.tolist(),
+            [submission_ids[i] for i in first.tolist()],
+            [submission_ids[i] for i in second.tolist()],
+        )
+    return copied
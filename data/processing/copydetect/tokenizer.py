@@ -0,0 +1,67 @@
+import hashlib
+import re
+from functools import lru_cache
+from typing import Dict, Optional
+
+import numpy as np
+import pygments.util
+from pygments import lexers, token
+from pygments.lexer import Lexer
+
+# same filtering as copydetect's filter_code: names collapse to V/F/O, strings to S, whitespace and comments go away
+VARIABLE, FUNCTION, CLASS, PREPROCESSOR, STRING, QUOTE = range(1, 7)
+RESERVED_IDS = 7
+SKIPPED = -1
+VARIABLE_TOKENS = {token.Name, token.Name.Variable, token.Name.Attribute}
+
+# ids of the remaining tokens (keywords, operators, literals) are derived from their text,
+# so they are the same in every process and fingerprints can be cached and shared
+_token_ids: Dict[str, int] = {}
+
+
+@lru_cache(maxsize=None)
+def get_lexer(language: str) -> Optional[Lexer]:
+    try:
+        return lexers.get_lexer_by_name(language)
+    except pygments.util.ClassNotFound:
+        return None
+
+
+@lru_cache(maxsize=None)
+def token_category(token_type) -> int:
+    # 0 means the token is kept as its own text
+    if token_type in VARIABLE_TOKENS:
+        return VARIABLE
+    if token_type in token.Name.Function:
+        return FUNCTION
+    if token_type in token.Name.Class:
+        return CLASS
+    if token_type == token.Comment.Preproc or token_type == token.Comment.Hashbang:
+        return PREPROCESSOR
+    if token_type in token.Text or token_type in token.Comment:
+        return SKIPPED
+    if token_type in token.Literal.String:
+        return STRING
+    return 0
+
+
+def token_id(text: str) -> int:
+    if text not in _token_ids:
+        digest = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=4).digest(), "little")
+        _token_ids[text] = RESERVED_IDS + digest % (2**16 - RESERVED_IDS)
+    return _token_ids[text]
+
+
+def tokenize(code: str, language: str) -> np.ndarray:
+    lexer = get_lexer(language)
+    if lexer is None:
+        return np.array([token_id(word) for word in re.findall(r"\S+", code)], dtype=np.uint16)
+    ids = []
+    for token_type, text in lexer.get_tokens(code):
+        category = token_category(token_type)
+        if category == SKIPPED:
+            continue
+        if category == STRING and (text == "'" or text == '"'):
+            category = QUOTE
+        ids.append(category or token_id(text))
+    return np.array(ids, dtype=np.uint16)
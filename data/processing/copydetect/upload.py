@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http import HTTPStatus
+from threading import BoundedSemaphore, Lock
+from typing import Dict, List, Optional
+
+import httpx
+from api_client import Client
+from api_client.api.plagiarism_controller import add_plagiarisms, replace_plagiarisms
+from api_client.models.plagiarism_dto import PlagiarismDTO
+from processing.copydetect.metrics import StageRecorder
+
+logger = logging.getLogger("processing/copydetect")
+logger.setLevel(os.getenv("LOG_LEVEL") or logging.INFO)
+
+# a chunk is closed once its JSON body would exceed this, a single larger group is still sent on its own
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES") or 256 * 1024)
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS") or 4)
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES") or 5)
+UPLOAD_BACKOFF_SECONDS = float(os.getenv("UPLOAD_BACKOFF_SECONDS") or 1)
+
+
+def chunk_plagiarisms(plagiarism_dtos: List[PlagiarismDTO], max_bytes: int) -> List[List[PlagiarismDTO]]:
+    chunks: List[List[PlagiarismDTO]] = []
+    chunk_bytes = 0
+    for plagiarism_dto in plagiarism_dtos:
+        size = len(json.dumps(plagiarism_dto.to_dict())) + 1
+        if not chunks or chunk_bytes + size > max_bytes:
+            chunks.append([])
+            chunk_bytes = 0
+        chunks[-1].append(plagiarism_dto)
+        chunk_bytes += size
+    return chunks
+
+
+# errors raised before the request was sent, the server cannot have stored anything
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def is_retryable(status_code: int, idempotent: bool) -> bool:
+    # 429 and 503 are answered without handling the request, after any other error (or a timeout)
+    # the groups may already be saved, and adding them again would store them twice
+    if status_code in (HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE):
+        return True
+    return idempotent and status_code >= 500
+
+
+class PlagiarismUploader:
+    # Sends plagiarism groups in size-capped chunks from a few threads sharing the client's connection pool,
+    # so detection goes on while earlier groups upload. submit blocks once too many chunks are waiting.
+    # With replace, each group replaces the stored groups of its detector run it shares a submission with.
+
+    def __init__(
+        self,
+        client: Client,
+        max_workers: int = UPLOAD_WORKERS,
+        chunk_bytes: int = UPLOAD_CHUNK_BYTES,
+        max_retries: int = UPLOAD_MAX_RETRIES,
+        replace: bool = False,
+    ):
+        self.client = client
+        self.replace = replace
+        self.chunk_bytes = chunk_bytes
+        self.max_retries = max_retries
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        self.pending = BoundedSemaphore(2 * max_workers)
+        self.lock = Lock()
+        self.futures: List[Future] = []
+        self.summary = {"groups": 0, "chunks": 0, "retries": 0, "failed_groups": 0, "failed_chunks": 0}
+
+    def submit(self, plagiarism_dtos: List[PlagiarismDTO], recorder: Optional[StageRecorder] = None) -> List[Future]:
+        futures = []
+        for chunk in chunk_plagiarisms(plagiarism_dtos, self.chunk_bytes):
+            self.pending.acquire()
+            future = self.executor.submit(self._upload, chunk, recorder)
+            future.add_done_callback(lambda _: self.pending.release())
+            futures.append(future)
+        self.futures += futures
+        return futures
+
+    def _upload(self, chunk: List[PlagiarismDTO], recorder: Optional[StageRecorder]) -> bool:
+        recorder = recorder or StageRecorder(None, None)
+        with recorder.stage("upload", items=len(chunk)) as record:
+            stored = self._send(chunk)
+            record["stored"] = stored
+        with self.lock:
+            self.summary["chunks" if stored else "failed_chunks"] += 1
+            self.summary["groups" if stored else "failed_groups"] += len(chunk)
+        return stored
+
+    def _send(self, chunk: List[PlagiarismDTO]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self.lock:
+                    self.summary["retries"] += 1
+                time.sleep(UPLOAD_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            try:
+                endpoint = replace_plagiarisms if self.replace else add_plagiarisms
+                response = endpoint.sync_detailed(client=self.client, body=chunk)
+            except httpx.HTTPError as e:
+                logger.warning(f"Uploading {len(chunk)} plagiarism groups failed ({e}), attempt {attempt + 1}")
+                # replacing is idempotent, sending the same groups again changes nothing
+                if self.replace or isinstance(e, UNSENT_ERRORS):
+                    continue
+                break
+            if response.status_code == HTTPStatus.OK:
+                return True
+            logger.warning(
+                f"Uploading {len(chunk)} plagiarism groups returned {response.status_code}, attempt {attempt + 1}"
+            )
+            if not is_retryable(response.status_code, self.replace):
+                break
+        logger.error(f"Could not upload {len(chunk)} plagiarism groups")
+        return False
+
+    def close(self) -> Dict[str, int]:
+        # waits for every submitted chunk
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            future.result()
+        logger.info(f"Uploaded plagiarism groups: {self.summary}")
+        return self.summary
@@ -0,0 +1,93 @@
+import logging
+import os
+import time
+from typing import Dict, List, Set, Tuple
+
+import boto3
+import numpy as np
+from api_client.models.detector_run import DetectorRun
+from api_client.models.question import Question
+from dotenv import load_dotenv
+from processing.copydetect import run as copydetect
+from processing.copydetect.incremental import IncrementalDetector
+from processing.copydetect.upload import PlagiarismUploader
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("processing/incremental")
+logger.setLevel(os.getenv("LOG_LEVEL") or logging.INFO)
+
+# the contest's submissions are fetched this often, only the ones not seen before are detected
+INCREMENTAL_POLL_SECONDS = int(os.getenv("INCREMENTAL_POLL_SECONDS") or 300)
+# the task stops after this many polls in a row without new submissions
+INCREMENTAL_IDLE_POLLS = int(os.getenv("INCREMENTAL_IDLE_POLLS") or 3)
+
+
+class ContestPoller:
+    # One IncrementalDetector per (question, language) and one detector run per question, for the whole task,
+    # new and grown plagiarism groups go to the uploader as soon as a poll finds them.
+
+    def __init__(self, questions: List[Question], uploader: PlagiarismUploader):
+        self.questions = questions
+        self.uploader = uploader
+        self.detector_runs: Dict[int, DetectorRun] = {}
+        self.detectors: Dict[Tuple[int, str], IncrementalDetector] = {}
+        self.seen: Dict[int, Set[int]] = {int(question.id or -1): set() for question in questions}
+
+    def poll(self) -> int:
+        return sum(self.poll_question(question) for question in self.questions)
+
+    def poll_question(self, question: Question) -> int:
+        question_id = int(question.id or -1)
+        submissions = copydetect.get_submissions(question)
+        seen = np.fromiter(self.seen[question_id], dtype=np.int64, count=len(self.seen[question_id]))
+        rows = np.flatnonzero(~np.isin(submissions.column("ids"), seen))
+        if len(rows) == 0:
+            return 0
+        submissions = submissions.take(rows)
+        if question_id not in self.detector_runs:
+            self.detector_runs[question_id] = copydetect.create_detector_run(question, None)
+        for language, language_rows in submissions.by_language().items():
+            if (question_id, language) not in self.detectors:
+                self.detectors[(question_id, language)] = IncrementalDetector(
+                    question, language, self.detector_runs[question_id]
+                )
+            plagiarism_dtos = self.detectors[(question_id, language)].add_submissions(submissions.take(language_rows))
+            if plagiarism_dtos:
+                self.uploader.submit(plagiarism_dtos)
+        self.seen[question_id].update(submissions.ids)
+        return len(rows)
+
+
+def process_contest(contest_slug: str):
+    logger.info(f"Following contest {contest_slug}")
+    # grown groups replace the ones posted before, so chunks are sent one at a time and in order,
+    # an older version of a group never lands after a newer one
+    uploader = PlagiarismUploader(copydetect.API_CLIENT, max_workers=1, replace=True)
+    poller = ContestPoller(copydetect.get_questions(contest_slug), uploader)
+    idle_polls = 0
+    while True:
+        new_submissions = poller.poll()
+        logger.info(f"Poll found {new_submissions} new submissions")
+        idle_polls = 0 if new_submissions else idle_polls + 1
+        if idle_polls >= INCREMENTAL_IDLE_POLLS:
+            break
+        time.sleep(INCREMENTAL_POLL_SECONDS)
+    upload_summary = uploader.close()
+    if upload_summary["failed_chunks"]:
+        raise RuntimeError(f"Could not upload {upload_summary['failed_groups']} plagiarism groups")
+
+
+def handler(event, context):
+    contest_slug = os.environ["CONTEST_SLUG"]
+    if os.environ.get("TASK_TOKEN"):
+        copydetect.setup_heartbeat()
+    process_contest(contest_slug)
+    if os.environ.get("TASK_TOKEN"):
+        client = boto3.client("stepfunctions")
+        client.send_task_success(taskToken=os.environ["TASK_TOKEN"], output="{}")
+
+
+if __name__ == "__main__":
+    handler({}, None)
@@ -1 +1,3 @@
-from .union_find import UnionFind
+from .json_stream import iter_json_array
+from .submission_batch import SubmissionBatch
+from .union_find import ArrayUnionFind, UnionFind
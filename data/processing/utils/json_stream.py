@@ -0,0 +1,63 @@
+import json
+from typing import Any, Iterable, Iterator
+
+_decoder = json.JSONDecoder()
+_whitespace = " \t\n\r"
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator[Any]:
+    # decodes a top-level JSON array element by element, so only one element has to be held at a time
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    # what comes next: "[", "first" (an element or "]"), "element", "delimiter" ("," or "]") or "end" (nothing)
+    expected = "["
+    exhausted = False
+    while True:
+        while position < len(buffer) and buffer[position] in _whitespace:
+            position += 1
+        if position < len(buffer):
+            character = buffer[position]
+            if expected == "end":
+                raise ValueError(f"Unexpected {character!r} after the JSON array")
+            if expected == "[":
+                if character != "[":
+                    raise ValueError(f"Expected a JSON array, got {character!r}")
+                expected = "first"
+                position += 1
+                continue
+            if character == "]" and expected in ("first", "delimiter"):
+                expected = "end"
+                position += 1
+                continue
+            if expected == "delimiter":
+                if character != ",":
+                    raise ValueError(f"Expected ',' or ']' in the JSON array, got {character!r}")
+                expected = "element"
+                position += 1
+                continue
+            try:
+                element, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+            else:
+                # an element is only complete once a delimiter follows it, a number cut by the chunk boundary
+                # ("1" or "1." of "1.5") decodes fine on its own but continues in the next chunk
+                if (end < len(buffer) and buffer[end] in _whitespace + ",]") or exhausted:
+                    position = end
+                    expected = "delimiter"
+                    yield element
+                    continue
+        elif exhausted:
+            if expected == "end":
+                return
+            raise ValueError("Unexpected end of JSON array")
+        # the next element is incomplete: drop what was consumed and read more
+        buffer = buffer[position:]
+        position = 0
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+        else:
+            buffer += chunk
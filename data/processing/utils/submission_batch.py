@@ -0,0 +1,107 @@
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+class SubmissionBatch:
+    # Column store for submissions: one array per field, interned languages and user slugs,
+    # and all the code in a single utf-8 buffer sliced by offsets, instead of one attrs object per submission.
+
+    __slots__ = (
+        "ids",
+        "dates",
+        "pages",
+        "question_ids",
+        "language_ids",
+        "user_ids",
+        "code_offsets",
+        "code_buffer",
+        "languages",
+        "users",
+        "_language_index",
+        "_user_index",
+    )
+
+    def __init__(self):
+        self.ids = array("q")
+        self.dates = array("q")
+        self.pages = array("q")
+        self.question_ids = array("q")
+        self.language_ids = array("H")
+        self.user_ids = array("l")
+        self.code_offsets = array("q", [0])
+        self.code_buffer = bytearray()
+        self.languages: List[str] = []
+        self.users: List[str] = []
+        self._language_index: Dict[str, int] = {}
+        self._user_index: Dict[str, int] = {}
+
+    @classmethod
+    def from_dicts(cls, submissions: Iterable[Dict[str, Any]]) -> "SubmissionBatch":
+        batch = cls()
+        for submission in submissions:
+            batch.append(
+                id=submission["id"],
+                code=submission["code"],
+                language=submission["language"],
+                date=submission["date"],
+                user_slug=submission["userSlug"],
+                page=submission["page"],
+                question_id=submission.get("questionId"),
+            )
+        return batch
+
+    def append(
+        self, id: int, code: str, language: str, date: int, user_slug: str, page: int, question_id: Optional[int]
+    ):
+        if language not in self._language_index:
+            self._language_index[language] = len(self.languages)
+            self.languages.append(language)
+        if user_slug not in self._user_index:
+            self._user_index[user_slug] = len(self.users)
+            self.users.append(user_slug)
+        self.ids.append(id)
+        self.dates.append(date)
+        self.pages.append(page)
+        self.question_ids.append(-1 if question_id is None else question_id)
+        self.language_ids.append(self._language_index[language])
+        self.user_ids.append(self._user_index[user_slug])
+        self.code_buffer += code.encode()
+        self.code_offsets.append(len(self.code_buffer))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def column(self, name: str) -> np.ndarray:
+        # zero-copy numpy view of one of the array columns
+        return np.frombuffer(getattr(self, name), dtype=getattr(self, name).typecode)
+
+    def code(self, i: int) -> str:
+        return self.code_buffer[self.code_offsets[i] : self.code_offsets[i + 1]].decode()
+
+    def by_language(self) -> Dict[str, np.ndarray]:
+        language_ids = self.column("language_ids")
+        return {language: np.flatnonzero(language_ids == i) for i, language in enumerate(self.languages)}
+
+    def sorted_by_date(self, rows: np.ndarray) -> np.ndarray:
+        return rows[np.argsort(self.column("dates")[rows], kind="stable")]
+
+    def first_per_user(self, rows: np.ndarray) -> np.ndarray:
+        # keeps the first row of every user, in the order of rows
+        _, first = np.unique(self.column("user_ids")[rows], return_index=True)
+        return rows[np.sort(first)]
+
+    def take(self, rows: np.ndarray) -> "SubmissionBatch":
+        batch = SubmissionBatch()
+        for name in ("ids", "dates", "pages", "question_ids", "language_ids", "user_ids"):
+            getattr(batch, name).frombytes(self.column(name)[rows].tobytes())
+        offsets = self.column("code_offsets")
+        lengths = offsets[rows + 1] - offsets[rows]
+        batch.code_offsets.frombytes(np.cumsum(lengths).tobytes())
+        batch.code_buffer = bytearray().join(self.code_buffer[offsets[i] : offsets[i + 1]] for i in rows.tolist())
+        batch.languages = self.languages
+        batch.users = self.users
+        batch._language_index = self._language_index
+        batch._user_index = self._user_index
+        return batch
@@ -1,4 +1,7 @@
 from collections import defaultdict
+from typing import Dict, Hashable, Iterable, Set, Tuple
+
+import numpy as np
 
 
 class UnionFind:
@@ -7,6 +10,14 @@ class UnionFind:
         self.parent = {x: x for x in items}
         self.size = {x: 1 for x in items}
 
+    def add(self, x):
+        if x in self.parent:
+            return False
+        self.items.append(x)
+        self.parent[x] = x
+        self.size[x] = 1
+        return True
+
     def find(self, x):
         if self.parent[x] != x:
             self.parent[x] = self.find(self.parent[x])
@@ -16,7 +27,7 @@ class UnionFind:
         root_x, root_y = self.find(x), self.find(y)
         if root_x == root_y:
             return False
-        if self.size[x] < self.size[y]:
+        if self.size[root_x] < self.size[root_y]:
             root_x, root_y = root_y, root_x
         self.parent[root_y] = root_x
         self.size[root_x] += self.size[root_y]
@@ -27,3 +38,86 @@ class UnionFind:
         for item in self.items:
             groups[self.find(item)].add(item)
         return groups
+
+
+class ArrayUnionFind:
+    # Same interface as UnionFind, but items are mapped to dense indices and parent/size live in numpy arrays,
+    # so find never recurses and large edge lists can be merged in bulk with unite_many.
+
+    def __init__(self, items):
+        self.items = list(dict.fromkeys(items))
+        self.index = {x: i for i, x in enumerate(self.items)}
+        self.parent = np.arange(max(len(self.items), 1), dtype=np.int64)
+        self.size = np.ones(max(len(self.items), 1), dtype=np.int64)
+
+    def add(self, x):
+        if x in self.index:
+            return False
+        i = len(self.items)
+        if i == len(self.parent):
+            self.parent = np.concatenate([self.parent, np.arange(i, 2 * i, dtype=np.int64)])
+            self.size = np.concatenate([self.size, np.ones(i, dtype=np.int64)])
+        self.items.append(x)
+        self.index[x] = i
+        return True
+
+    def _find(self, i: int) -> int:
+        parent = self.parent
+        # path halving: every visited node is pointed at its grandparent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = int(parent[i])
+        return i
+
+    def find(self, x):
+        return self.items[self._find(self.index[x])]
+
+    def unite(self, x, y):
+        root_x, root_y = self._find(self.index[x]), self._find(self.index[y])
+        if root_x == root_y:
+            return False
+        if self.size[root_x] < self.size[root_y]:
+            root_x, root_y = root_y, root_x
+        self.parent[root_y] = root_x
+        self.size[root_x] += self.size[root_y]
+        return True
+
+    def _compress(self) -> np.ndarray:
+        # points every item straight at its root
+        parent = self.parent[: len(self.items)]
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                return parent
+            parent[:] = grandparent
+
+    def unite_many(self, edges: Iterable[Tuple[Hashable, Hashable]]) -> int:
+        pairs = np.array([(self.index[x], self.index[y]) for x, y in edges], dtype=np.int64).reshape(-1, 2)
+        first, second = pairs[:, 0], pairs[:, 1]
+        united = 0
+        # every round hooks the larger root of each still split edge onto the smallest root it is linked to,
+        # hooked roots always point to a smaller index, so no cycles can form and every round removes roots
+        while True:
+            parent = self._compress()
+            root_first, root_second = parent[first], parent[second]
+            split = root_first != root_second
+            if not split.any():
+                break
+            first, second = first[split], second[split]
+            low = np.minimum(root_first[split], root_second[split])
+            high = np.maximum(root_first[split], root_second[split])
+            np.minimum.at(parent, high, low)
+            united += len(np.unique(high))
+        self.size[: len(self.items)] = np.bincount(parent, minlength=len(self.items))
+        return united
+
+    def get_groups(self) -> Dict[Hashable, Set[Hashable]]:
+        parent = self._compress()
+        order = np.argsort(parent, kind="stable")
+        roots, starts = np.unique(parent[order], return_index=True)
+        items = np.empty(len(self.items), dtype=object)
+        items[:] = self.items
+        return {
+            self.items[root]: set(members.tolist())
+            for root, members in zip(roots.tolist(), np.split(items[order], starts[1:]))
+        }
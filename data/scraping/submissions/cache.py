@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger("scraping/submissions")
+logger.setLevel(os.getenv("LOG_LEVEL") or logging.INFO)
+
+
+class ResponseCache:
+    # Response bodies stored compressed in a sqlite file, addressed by the hash of their content,
+    # with each URL pointing at the body it last returned. `ttls` maps URL prefixes to how long
+    # their responses stay fresh: None keeps them forever, URLs matching no prefix are never cached.
+
+    def __init__(self, path: str, max_bytes: int, ttls: List[Tuple[str, Optional[float]]]):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS bodies (content_hash BLOB PRIMARY KEY, body BLOB, size INTEGER)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, content_hash BLOB, stored REAL, accessed REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS urls_accessed ON urls (accessed)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS urls_content_hash ON urls (content_hash)")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+
+    def ttl(self, url: str) -> Tuple[bool, Optional[float]]:
+        for prefix, ttl in self.ttls:
+            if url.startswith(prefix):
+                return True, ttl
+        return False, None
+
+    def get(self, url: str) -> Optional[bytes]:
+        cacheable, ttl = self.ttl(url)
+        if not cacheable:
+            return None
+        row = self.connection.execute(
+            "SELECT bodies.body, urls.stored FROM urls JOIN bodies USING (content_hash) WHERE urls.url = ?", (url,)
+        ).fetchone()
+        now = time.time()
+        if row is None or (ttl is not None and now - row[1] > ttl):
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.connection:
+            self.connection.execute("UPDATE urls SET accessed = ? WHERE url = ?", (now, url))
+        return zlib.decompress(row[0])
+
+    def put(self, url: str, content: bytes):
+        cacheable, _ = self.ttl(url)
+        if not cacheable:
+            return
+        content_hash = hashlib.blake2b(content, digest_size=16).digest()
+        now = time.time()
+        with self.connection:
+            # identical bodies (e.g. every empty ranking page) are stored once
+            known = self.connection.execute("SELECT 1 FROM bodies WHERE content_hash = ?", (content_hash,)).fetchone()
+            if known is None:
+                body = zlib.compress(content)
+                self.connection.execute("INSERT INTO bodies VALUES (?, ?, ?)", (content_hash, body, len(body)))
+                self.total_bytes += len(body)
+            self.connection.execute("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?)", (url, content_hash, now, now))
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # drop the least recently used URLs and the bodies nothing points at anymore, until we are at 90% of the cap
+        to_free = self.total_bytes - int(self.max_bytes * 0.9)
+        with self.connection:
+            while to_free > 0:
+                urls = self.connection.execute("SELECT url FROM urls ORDER BY accessed LIMIT 100").fetchall()
+                if not urls:
+                    break
+                self.connection.executemany("DELETE FROM urls WHERE url = ?", urls)
+                freed = self.connection.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM bodies "
+                    "WHERE content_hash NOT IN (SELECT content_hash FROM urls)"
+                ).fetchone()[0]
+                self.connection.execute("DELETE FROM bodies WHERE content_hash NOT IN (SELECT content_hash FROM urls)")
+                self.total_bytes -= freed
+                to_free -= freed
+
+    def close(self):
+        logger.info(f"Response cache: {self.hits} hits, {self.misses} misses, {self.total_bytes} bytes stored")
+        self.connection.close()
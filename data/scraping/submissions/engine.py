@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from random import randint
+from typing import AsyncIterator, Callable, Dict, Optional
+
+import httpx
+from scraping.submissions.cache import ResponseCache
+
+logger = logging.getLogger("scraping/submissions")
+logger.setLevel(os.getenv("LOG_LEVEL") or logging.INFO)
+# httpx logs every request at INFO, which would be thousands of lines per contest
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class FetchError(Exception):
+    pass
+
+
+class AIMDLimiter:
+    # Caps the requests in flight with a window that grows by one per window's worth of fast successful responses
+    # and is cut by `decrease_factor` on a failure (an error status such as 429, a timeout, a dropped connection).
+    # Only requests started after the last cut can cut again, so one burst of failures counts once.
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float, decrease_factor: float = 0.5):
+        self.window = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.released = asyncio.Event()
+        self.summary = {"succeeded": 0, "failed": 0, "slow": 0, "decreases": 0}
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        # an exception raised inside the block counts as a failure, cancellation counts as nothing
+        while self.in_flight >= int(self.window):
+            self.released.clear()
+            await self.released.wait()
+        self.in_flight += 1
+        started = time.monotonic()
+        healthy = None
+        try:
+            yield
+            healthy = True
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self.in_flight -= 1
+            if healthy is not None:
+                self._adjust(started, healthy)
+            self.released.set()
+
+    def _adjust(self, started: float, healthy: bool):
+        if not healthy:
+            self.summary["failed"] += 1
+            if started >= self.last_decrease:
+                self.window = max(float(self.minimum), self.window * self.decrease_factor)
+                self.last_decrease = time.monotonic()
+                self.summary["decreases"] += 1
+                logger.info(f"Request failed, concurrency window down to {int(self.window)}")
+            return
+        self.summary["succeeded"] += 1
+        if time.monotonic() - started > self.latency_target:
+            self.summary["slow"] += 1
+            return
+        before = int(self.window)
+        self.window = min(float(self.maximum), self.window + 1 / self.window)
+        if int(self.window) > before:
+            logger.info(f"Concurrency window up to {int(self.window)}")
+
+
+class AsyncScraper:
+    # One pooled httpx.AsyncClient for the whole scrape, so connections (and the proxy's TLS tunnels)
+    # are kept alive between requests, with as many requests in flight as the limiter's window allows.
+
+    def __init__(
+        self,
+        headers: Dict[str, str],
+        limiter: AIMDLimiter,
+        max_retries: int,
+        timeout: float,
+        proxy_url: Optional[str] = None,
+        user_agent: Optional[Callable[[], str]] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        self.max_retries = max_retries
+        self.user_agent = user_agent
+        self.cache = cache
+        self.limiter = limiter
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            timeout=timeout,
+            transport=httpx.AsyncHTTPTransport(
+                proxy=httpx.Proxy(proxy_url) if proxy_url else None,
+                limits=httpx.Limits(max_connections=limiter.maximum, max_keepalive_connections=limiter.maximum),
+            ),
+        )
+
+    async def __aenter__(self) -> "AsyncScraper":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.client.aclose()
+        logger.info(f"Concurrency window ended at {int(self.limiter.window)}, {self.limiter.summary}")
+        if self.cache:
+            self.cache.close()
+
+    async def get(self, url: str, headers_override: Optional[Dict[str, str]] = None) -> dict:
+        if self.cache:
+            content = self.cache.get(url)
+            if content is not None:
+                return json.loads(content)
+        headers = dict(headers_override or {})
+        delay = 1
+        for i in range(self.max_retries):
+            try:
+                if self.user_agent:
+                    headers["user-agent"] = self.user_agent()
+                # the slot is only held for the request itself, not for the backoff
+                async with self.limiter.slot():
+                    response = await self.client.get(url, headers=headers)
+                    response.raise_for_status()
+                data = response.json()
+                if self.cache:
+                    self.cache.put(url, response.content)
+                return data
+            except Exception as _:
+                logger.error(f"Failed to fetch {url} (try {i})")
+                await asyncio.sleep(randint(1, delay))
+                delay = min(delay * 2, 30)  # exponential backoff
+        raise FetchError(f"Could not fetch {url} for {self.max_retries} times")
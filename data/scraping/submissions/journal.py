@@ -0,0 +1,57 @@
+import json
+import os
+import sqlite3
+from typing import Dict, List, Optional, Set
+
+
+class ScrapeJournal:
+    # Durable record of a contest scrape: every fetched submission is committed as soon as its code arrives,
+    # and a ranking page is marked done once all of its submissions are in, so a restarted run skips both.
+    # ":memory:" keeps the same bookkeeping without anything to resume from.
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        # one commit per submission, WAL with NORMAL sync survives the process dying without an fsync each time
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS pages (page INTEGER PRIMARY KEY, contest_id INTEGER)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            "submission_id INTEGER PRIMARY KEY, page INTEGER, position INTEGER, data TEXT)"
+        )
+        self.connection.commit()
+
+    def completed_pages(self) -> Dict[int, Optional[int]]:
+        # page -> contest id seen on it
+        return dict(self.connection.execute("SELECT page, contest_id FROM pages"))
+
+    def fetched_ids(self, page: int) -> Set[int]:
+        rows = self.connection.execute("SELECT submission_id FROM submissions WHERE page = ?", (page,))
+        return {submission_id for (submission_id,) in rows}
+
+    def add_submission(self, submission_id: int, page: int, position: int, data: Optional[dict]):
+        # data is None when the code could not be read, the submission still counts as done
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?)",
+                (submission_id, page, position, json.dumps(data) if data is not None else None),
+            )
+
+    def complete_page(self, page: int, contest_id: Optional[int]):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO pages VALUES (?, ?)", (page, contest_id))
+
+    def submissions(self) -> List[dict]:
+        rows = self.connection.execute("SELECT data FROM submissions WHERE data IS NOT NULL ORDER BY page, position")
+        return [json.loads(data) for (data,) in rows]
+
+    def discard(self):
+        # called once the scrape is saved, the next run of the contest starts over
+        self.connection.close()
+        if self.path != ":memory:":
+            for suffix in ["", "-wal", "-shm"]:
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
@@ -1,14 +1,11 @@
-import concurrent.futures
+import asyncio
 import csv
 import json
 import logging
 import os
 import sys
-import urllib.request
-from random import randint
 from threading import Event, Thread
-from time import sleep
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
 import boto3
 from api_client import Client
@@ -24,6 +21,9 @@ from api_client.types import Response
 from dotenv import load_dotenv
 from random_user_agent.params import OperatingSystem, SoftwareName
 from random_user_agent.user_agent import UserAgent
+from scraping.submissions.cache import ResponseCache
+from scraping.submissions.engine import AIMDLimiter, AsyncScraper, FetchError
+from scraping.submissions.journal import ScrapeJournal
 
 load_dotenv()
 
@@ -47,9 +47,22 @@ HEADERS = {
 }
 
 PAGE_LIMIT = int(os.getenv("PAGE_LIMIT") or 100)
-NUM_WORKERS = 10
+# requests in flight at once, over connections that are kept alive for the whole scrape: the window starts at
+# INITIAL_CONCURRENT_REQUESTS, grows while responses come back within REQUEST_LATENCY_TARGET_SEC and halves on failures
+INITIAL_CONCURRENT_REQUESTS = int(os.getenv("INITIAL_CONCURRENT_REQUESTS") or 10)
+MIN_CONCURRENT_REQUESTS = int(os.getenv("MIN_CONCURRENT_REQUESTS") or 1)
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS") or 32)
+REQUEST_LATENCY_TARGET_SEC = float(os.getenv("REQUEST_LATENCY_TARGET_SEC") or 2)
+# ranking pages fetched ahead of the one being read
+RANKING_PAGES_AHEAD = int(os.getenv("RANKING_PAGES_AHEAD") or 3)
 MAX_RETRIES = 50
 REQUEST_TIMEOUT_SEC = 15
+# fetched pages and submissions are kept here per contest, so a run that dies can be restarted where it stopped
+SCRAPE_JOURNAL_DIR = os.getenv("SCRAPE_JOURNAL_DIR")
+# responses are cached here when set, submissions never change once the contest is over but ranking pages can
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH")
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES") or 1 << 30)
+RANKING_CACHE_TTL_SEC = int(os.getenv("RANKING_CACHE_TTL_SEC") or 3600)
 
 OXYLABS_CREDENTIALS = os.getenv("OXYLABS_CREDENTIALS")
 USER_AGENT_ROTATOR = UserAgent(
@@ -63,41 +76,35 @@ if os.getenv("API_BASE_URL"):
     API_CLIENT = Client(base_url=str(os.getenv("API_BASE_URL")))
 
 
-def get(url: str, headers_override=None) -> dict:
-    headers_override = headers_override or {}
-    headers = HEADERS.copy()
-    for k in headers_override:
-        headers[k] = headers_override[k]
-    delay = 1
-    for i in range(MAX_RETRIES):
-        try:
-            headers["user-agent"] = USER_AGENT_ROTATOR.get_random_user_agent()
-            if not OXYLABS_CREDENTIALS:
-                request = urllib.request.Request(url, headers=headers)
-                response = urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_SEC)
-                return json.loads(response.read().decode())
-            else:
-                proxy_url = f"http://customer-{OXYLABS_CREDENTIALS}@pr.oxylabs.io:7777"
-                proxy = urllib.request.ProxyHandler(
-                    {
-                        "http": proxy_url,
-                        "https": proxy_url,
-                    }
-                )
-                opener = urllib.request.build_opener(proxy)
-                request = urllib.request.Request(url, headers=headers)
-                response = opener.open(request, timeout=REQUEST_TIMEOUT_SEC)
-                return json.loads(response.read().decode())
-        except Exception as _:
-            logger.error(f"Failed to fetch {url} (try {i})")
-            sleep(randint(1, delay))
-            delay = min(delay * 2, 30)  # exponential backoff
-    logger.error(f"Something went wrong, could not fetch {url} for {MAX_RETRIES} times, exiting")
-    sys.exit(1)
-
-
-def get_questions(contest_slug: str) -> List[QuestionDTO]:
-    response = get(
+def create_scraper() -> AsyncScraper:
+    proxy_url = None
+    if OXYLABS_CREDENTIALS:
+        proxy_url = f"http://customer-{OXYLABS_CREDENTIALS}@pr.oxylabs.io:7777"
+    cache = None
+    if HTTP_CACHE_PATH:
+        cache = ResponseCache(
+            HTTP_CACHE_PATH,
+            HTTP_CACHE_MAX_BYTES,
+            ttls=[(SUBMISSIONS_API_URL, None), (CONTEST_API_URL, RANKING_CACHE_TTL_SEC)],
+        )
+    return AsyncScraper(
+        HEADERS,
+        AIMDLimiter(
+            initial=INITIAL_CONCURRENT_REQUESTS,
+            minimum=MIN_CONCURRENT_REQUESTS,
+            maximum=MAX_CONCURRENT_REQUESTS,
+            latency_target=REQUEST_LATENCY_TARGET_SEC,
+        ),
+        max_retries=MAX_RETRIES,
+        timeout=REQUEST_TIMEOUT_SEC,
+        proxy_url=proxy_url,
+        user_agent=USER_AGENT_ROTATOR.get_random_user_agent,
+        cache=cache,
+    )
+
+
+async def get_questions(scraper: AsyncScraper, contest_slug: str) -> List[QuestionDTO]:
+    response = await scraper.get(
         f"{CONTEST_API_URL}/{contest_slug}/?pagination=1&region=global",
         {"Referer": f"{CONTEST_BASE_URL}/{contest_slug}/ranking/1/"},
     )
@@ -117,15 +124,15 @@ def get_questions(contest_slug: str) -> List[QuestionDTO]:
     return questions
 
 
-def get_submissions(contest_slug: str, page: int) -> dict:
-    return get(
+async def get_submissions(scraper: AsyncScraper, contest_slug: str, page: int) -> dict:
+    return await scraper.get(
         f"{CONTEST_API_URL}/{contest_slug}/?pagination={page}&region=global",
         {"Referer": f"{CONTEST_BASE_URL}/{contest_slug}/ranking/{page}/"},
     )
 
 
-def get_submission_with_code(submission_id: str, contest_slug: str, page: int) -> dict:
-    return get(
+async def get_submission_with_code(scraper: AsyncScraper, submission_id: str, contest_slug: str, page: int) -> dict:
+    return await scraper.get(
         f"{SUBMISSIONS_API_URL}/{submission_id}",
         {"Referer": f"{CONTEST_BASE_URL}/{contest_slug}/ranking/{page}/"},
     )
@@ -151,65 +158,141 @@ def save_local(submissions: List[SubmissionDTO]):
         csv.writer(file).writerows([submission.to_dict().values() for submission in submissions])
 
 
-def get_all_submissions(contest_slug: str, lookup_questions: List[QuestionDTO]) -> Tuple[Contest, List[SubmissionDTO]]:
+async def get_all_submissions(
+    scraper: AsyncScraper, contest_slug: str, lookup_questions: List[QuestionDTO], journal: ScrapeJournal
+) -> Tuple[Contest, List[SubmissionDTO]]:
+    # ranking pages are fetched up to RANKING_PAGES_AHEAD ahead of the one being read, and every page's code fetches
+    # go to the same workers, pages are still read in order so the stop conditions see them as before.
+    # Pages and submissions already in the journal from an earlier run are not fetched again.
     logger.info(f"Fetching submissions for contest {contest_slug}")
     lookup_question_ids = [question.id for question in lookup_questions]
     contest = None
-    submissions: List[SubmissionDTO] = []
-    i = 1
-    while True:
-        response = get_submissions(contest_slug, i)
-        if i == PAGE_LIMIT or not response["submissions"]:  # pages are over
-            break
-        logger.info(f"Processing page {i}")
-        page_submissions = []
-        count = 0
-        for user_submissions, user in zip(response["submissions"], response["total_rank"]):
-            for question_id in user_submissions:
-                if int(question_id) not in lookup_question_ids:
-                    continue
-                count += 1
-                if user_submissions[question_id]["data_region"] == "CN":
-                    continue
-                if not contest:
-                    contest = Contest(id=user["contest_id"], slug=contest_slug)
-                user_submissions[question_id]["userSlug"] = user["user_slug"]
-                user_submissions[question_id]["page"] = i
-                user_submissions[question_id]["questionId"] = int(question_id)
-                page_submissions.append(user_submissions[question_id])
-        # 0 submissions for the problems we are interested in (in practice, Q3 and Q4 -- hence, we can stop here)
-        if count == 0:
-            logger.info("No more submissions for the questions we are interested in, stopping")
-            break
-        with concurrent.futures.ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-            for submission, code in zip(
-                page_submissions,
-                executor.map(
-                    lambda id: get_submission_with_code(id, contest_slug, i),
-                    [sub["submission_id"] for sub in page_submissions],
-                ),
-            ):
+    completed_pages = journal.completed_pages()
+    if completed_pages:
+        logger.info(f"Resuming contest {contest_slug}, {len(completed_pages)} pages already fetched")
+    # code fetches still running for each page that was read
+    outstanding: Dict[int, int] = {}
+    failures: List[Exception] = []
+    queue: "asyncio.Queue[Tuple[int, dict, int]]" = asyncio.Queue(maxsize=2 * MAX_CONCURRENT_REQUESTS)
+
+    def page_done(page: int):
+        outstanding[page] -= 1
+        if outstanding[page] == 0:
+            journal.complete_page(page, contest.id if contest else None)
+
+    async def fetch_codes():
+        while True:
+            position, submission, page = await queue.get()
+            try:
+                code = await get_submission_with_code(scraper, submission["submission_id"], contest_slug, page)
                 if code:
                     submission["language"] = code["lang"]
                     submission["code"] = code["code"]
-                    submission["page"] = i
-                    submissions.append(SubmissionDTO.from_dict(submission))
-        logger.info(f"Fetched {len(page_submissions)} submissions from page {i}")
-        i += 1
+                    submission["page"] = page
+                journal.add_submission(submission["submission_id"], page, position, submission if code else None)
+                page_done(page)
+            except Exception as e:
+                failures.append(e)
+            finally:
+                queue.task_done()
+
+    # enough workers for the largest window, the scraper's limiter decides how many of them are fetching
+    workers = [asyncio.create_task(fetch_codes()) for _ in range(MAX_CONCURRENT_REQUESTS)]
+    pages: Dict[int, "asyncio.Task[dict]"] = {}
+    i = 1
+    try:
+        while True:
+            if i in completed_pages and i != PAGE_LIMIT:
+                if not contest and completed_pages[i] is not None:
+                    contest = Contest(id=completed_pages[i], slug=contest_slug)
+                i += 1
+                continue
+            for page in range(i, min(i + RANKING_PAGES_AHEAD, PAGE_LIMIT) + 1):
+                if page not in pages and page not in completed_pages:
+                    pages[page] = asyncio.create_task(get_submissions(scraper, contest_slug, page))
+            response = await pages.pop(i)
+            if i == PAGE_LIMIT or not response["submissions"]:  # pages are over
+                break
+            logger.info(f"Processing page {i}")
+            page_submissions = []
+            count = 0
+            for user_submissions, user in zip(response["submissions"], response["total_rank"]):
+                for question_id in user_submissions:
+                    if int(question_id) not in lookup_question_ids:
+                        continue
+                    count += 1
+                    if user_submissions[question_id]["data_region"] == "CN":
+                        continue
+                    if not contest:
+                        contest = Contest(id=user["contest_id"], slug=contest_slug)
+                    user_submissions[question_id]["userSlug"] = user["user_slug"]
+                    user_submissions[question_id]["page"] = i
+                    user_submissions[question_id]["questionId"] = int(question_id)
+                    page_submissions.append(user_submissions[question_id])
+            # 0 submissions for the problems we are interested in (in practice, Q3 and Q4 -- hence, we can stop here)
+            if count == 0:
+                logger.info("No more submissions for the questions we are interested in, stopping")
+                break
+            fetched_ids = journal.fetched_ids(i)
+            to_fetch = [
+                (position, submission)
+                for position, submission in enumerate(page_submissions)
+                if submission["submission_id"] not in fetched_ids
+            ]
+            # the extra count is released once the whole page is queued, so the page cannot complete early
+            outstanding[i] = len(to_fetch) + 1
+            for position, submission in to_fetch:
+                await queue.put((position, submission, i))
+            page_done(i)
+            if failures:
+                raise failures[0]
+            logger.info(f"Queued {len(to_fetch)} of {len(page_submissions)} submissions from page {i}")
+            i += 1
+        # pages that were already read still get all their code fetched
+        await queue.join()
+        if failures:
+            raise failures[0]
+    finally:
+        for task in [*workers, *pages.values()]:
+            task.cancel()
+        await asyncio.gather(*workers, *pages.values(), return_exceptions=True)
     assert contest
+    submissions = [SubmissionDTO.from_dict(submission) for submission in journal.submissions()]
+    logger.info(f"Fetched {len(submissions)} submissions from {i - 1} pages")
     return (contest, submissions)
 
 
+def open_journal(contest_slug: str) -> ScrapeJournal:
+    if not SCRAPE_JOURNAL_DIR:
+        return ScrapeJournal(":memory:")
+    return ScrapeJournal(os.path.join(SCRAPE_JOURNAL_DIR, f"{contest_slug}.sqlite"))
+
+
+async def scrape_contest(
+    contest_slug: str, journal: ScrapeJournal
+) -> Tuple[List[QuestionDTO], Contest, List[SubmissionDTO]]:
+    async with create_scraper() as scraper:
+        questions = await get_questions(scraper, contest_slug)
+        questions = questions[2:]
+        contest, submissions = await get_all_submissions(scraper, contest_slug, questions, journal)
+    return questions, contest, submissions
+
+
 def process_contest(contest_slug: str) -> List[str]:
     logger.info(f"Processing contest {contest_slug}")
-    questions = get_questions(contest_slug)
-    questions = questions[2:]
-    contest, submissions = get_all_submissions(contest_slug, questions)
+    journal = open_journal(contest_slug)
+    try:
+        questions, contest, submissions = asyncio.run(scrape_contest(contest_slug, journal))
+    except FetchError as e:
+        # whatever was fetched stays in the journal for the next run
+        logger.error(f"Something went wrong, {e}, exiting")
+        sys.exit(1)
     logger.info(f"Saving {len(submissions)} submissions")
     if API_CLIENT:
         save_api(contest, questions, submissions)
     else:
         save_local(submissions)
+    journal.discard()
     return [question.name for question in questions]
 
 
@@ -0,0 +1,72 @@
+from itertools import combinations
+from typing import Dict
+
+import numpy as np
+import pytest
+from processing.copydetect.engine import find_copied
+from processing.copydetect.index import find_copied_indexed
+from processing.copydetect.prefix import find_copied_prefix
+from processing.copydetect.sparse import find_copied_sparse
+
+THRESHOLDS = [0.3, 0.5, 0.65, 0.8, 0.9, 0.95]
+
+
+def random_group(seed: int) -> Dict[int, np.ndarray]:
+    # families of near copies around a few solutions, mutated at different rates so their sims spread
+    # over every threshold, next to unrelated submissions, exact copies and empty fingerprints
+    rng = np.random.default_rng(seed)
+    pool = rng.integers(0, 2**63, 400, dtype=np.uint64)
+    fingerprints = {}
+    submission_id = 1000 * seed
+    for _ in range(6):
+        solution = rng.choice(pool, int(rng.integers(5, 60)), replace=False)
+        for _ in range(int(rng.integers(2, 12))):
+            kept = solution[rng.random(len(solution)) > rng.uniform(0, 0.5)]
+            added = rng.choice(pool, int(rng.integers(0, 10)))
+            submission_id += int(rng.integers(1, 5))
+            fingerprints[submission_id] = np.unique(np.concatenate([kept, added]))
+    for _ in range(20):
+        submission_id += 1
+        fingerprints[submission_id] = np.unique(rng.choice(pool, int(rng.integers(0, 40))))
+    copied_ids = rng.choice(list(fingerprints), 3, replace=False).tolist()
+    for copied_id in copied_ids:
+        submission_id += 1
+        fingerprints[submission_id] = fingerprints[copied_id]
+    return fingerprints
+
+
+def brute_force(fingerprints: Dict[int, np.ndarray], threshold: float, max_document_frequency: int = 0):
+    hashes, frequencies = np.unique(np.concatenate(list(fingerprints.values())), return_counts=True)
+    counted = hashes[frequencies <= max_document_frequency] if max_document_frequency else hashes
+    copied = []
+    for (id1, hashes1), (id2, hashes2) in combinations(fingerprints.items(), 2):
+        if len(hashes1) == 0 or len(hashes2) == 0:
+            continue
+        shared = len(np.intersect1d(np.intersect1d(hashes1, hashes2), counted))
+        sim1, sim2 = shared / len(hashes1), shared / len(hashes2)
+        if sim1 > threshold and sim2 > threshold:
+            copied.append((sim1, sim2, id1, id2))
+    return sorted(copied)
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("threshold", THRESHOLDS)
+def test_backends_find_exactly_the_brute_force_pairs(seed, threshold):
+    fingerprints = random_group(seed)
+    expected = brute_force(fingerprints, threshold)
+    assert expected
+
+    assert sorted(find_copied(fingerprints, threshold)) == expected
+    assert sorted(find_copied_sparse(fingerprints, threshold)) == expected
+    assert sorted(find_copied_indexed(fingerprints, threshold)) == expected
+    assert sorted(find_copied_prefix(fingerprints, threshold)) == expected
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("threshold", [0.3, 0.8])
+def test_capped_backends_skip_the_same_fingerprints(seed, threshold):
+    fingerprints = random_group(seed)
+    expected = brute_force(fingerprints, threshold, max_document_frequency=6)
+
+    assert sorted(find_copied_sparse(fingerprints, threshold, 6)) == expected
+    assert sorted(find_copied_indexed(fingerprints, threshold, 6)) == expected
@@ -0,0 +1,77 @@
+import os
+from typing import Dict, List
+
+import numpy as np
+import pytest
+from processing.copydetect import corpus
+from processing.copydetect.corpus import FingerprintCorpus
+
+THRESHOLD = 0.5
+MAX_DOCUMENT_FREQUENCY = 12
+
+
+def make_questions(seed: int, count: int) -> List[Dict[int, np.ndarray]]:
+    # a few solutions copied with small changes across questions, all sharing a scaffold that is in every submission
+    rng = np.random.default_rng(seed)
+    scaffold = rng.integers(0, 2**63, 6, dtype=np.uint64)
+    solutions = [rng.integers(0, 2**63, int(rng.integers(15, 30)), dtype=np.uint64) for _ in range(8)]
+    questions = []
+    submission_id = 0
+    for _ in range(count):
+        fingerprints = {}
+        for _ in range(int(rng.integers(2, 4))):
+            submission_id += 1
+            solution = solutions[int(rng.integers(len(solutions)))]
+            kept = solution[rng.random(len(solution)) > 0.15]
+            noise = rng.integers(0, 2**63, int(rng.integers(0, 4)), dtype=np.uint64)
+            fingerprints[submission_id] = np.unique(np.concatenate([scaffold, kept, noise]))
+        questions.append(fingerprints)
+    return questions
+
+
+def build(directory: str, questions: List[Dict[int, np.ndarray]]) -> FingerprintCorpus:
+    fingerprint_corpus = FingerprintCorpus(directory)
+    for question_id, fingerprints in enumerate(questions):
+        fingerprint_corpus.append(question_id, fingerprints)
+    return fingerprint_corpus
+
+
+def brute_force(questions: List[Dict[int, np.ndarray]], query: Dict[int, np.ndarray], question_id: int):
+    history = {submission_id: hashes for fingerprints in questions for submission_id, hashes in fingerprints.items()}
+    hashes, frequencies = np.unique(np.concatenate(list(history.values())), return_counts=True)
+    capped = hashes[frequencies > MAX_DOCUMENT_FREQUENCY]
+    copied = []
+    for query_id, query_hashes in query.items():
+        for submission_id, hashes in history.items():
+            shared = len(np.setdiff1d(np.intersect1d(query_hashes, hashes), capped))
+            sim1, sim2 = shared / len(query_hashes), shared / len(hashes)
+            if sim1 > THRESHOLD and sim2 > THRESHOLD:
+                copied.append((sim1, sim2, query_id, submission_id))
+    return sorted(copied)
+
+
+def test_capped_query_does_not_depend_on_compaction(tmp_path, monkeypatch):
+    questions = make_questions(seed=1, count=40)
+    history, query = questions[:-1], questions[-1]
+    monkeypatch.setattr(corpus, "MERGE_CHUNK", 16)
+    compacted = build(str(tmp_path / "compacted"), history)
+    monkeypatch.setattr(corpus, "SEGMENTS_PER_TIER", len(history) + 1)
+    uncompacted = build(str(tmp_path / "uncompacted"), history)
+    assert len(compacted._segments()) < len(uncompacted._segments()) == len(history)
+
+    expected = brute_force(history, query, len(questions) - 1)
+    compacted_copied = sorted(compacted.query(query, THRESHOLD, len(questions) - 1, MAX_DOCUMENT_FREQUENCY))
+    uncompacted_copied = sorted(uncompacted.query(query, THRESHOLD, len(questions) - 1, MAX_DOCUMENT_FREQUENCY))
+
+    assert expected
+    assert compacted_copied == pytest.approx(expected)
+    assert uncompacted_copied == pytest.approx(expected)
+
+
+def test_appends_each_question_once(tmp_path):
+    questions = make_questions(seed=2, count=3)
+    fingerprint_corpus = build(str(tmp_path), questions)
+    fingerprint_corpus.append(1, questions[1])
+
+    assert len(fingerprint_corpus._documents()) == sum(len(fingerprints) for fingerprints in questions)
+    assert sorted(os.listdir(fingerprint_corpus.questions_directory)) == ["0", "1", "2"]
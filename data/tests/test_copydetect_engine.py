@@ -0,0 +1,26 @@
+import numpy as np
+from processing.copydetect.engine import find_copied, suppress_boilerplate
+
+
+def test_does_not_flag_submissions_that_only_differ_in_their_boilerplate():
+    # two templates shared by half of the submissions each, the others add code of their own,
+    # 1000 and 1001 use different templates and only share 3 fingerprints of glue
+    rng = np.random.default_rng(0)
+    templates = [rng.integers(0, 2**63, 30, dtype=np.uint64) for _ in range(2)]
+    glue = rng.integers(0, 2**63, 3, dtype=np.uint64)
+    fingerprints = {
+        submission_id: np.unique(
+            np.concatenate([templates[submission_id % 2], rng.integers(0, 2**63, 12, dtype=np.uint64)])
+        )
+        for submission_id in range(98)
+    }
+    fingerprints[1000] = np.unique(np.concatenate([templates[0], glue]))
+    fingerprints[1001] = np.unique(np.concatenate([templates[1], glue]))
+
+    assert find_copied(fingerprints, 0.8) == []
+    assert find_copied(suppress_boilerplate(fingerprints, 0.3, 20), 0.8) == [(1.0, 1.0, 1000, 1001)]
+
+    compared = suppress_boilerplate(fingerprints, 0.3, 20, 10)
+    assert find_copied(compared, 0.8) == []
+    assert sorted(compared) == list(range(98))
+    assert all(len(compared[submission_id]) == 12 for submission_id in compared)
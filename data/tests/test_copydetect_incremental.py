@@ -0,0 +1,65 @@
+import random
+from typing import List
+
+from api_client.models.detector_run import DetectorRun
+from api_client.models.question import Question
+from processing.copydetect.incremental import IncrementalDetector
+from processing.copydetect.run import PARAMETERS
+from processing.utils import SubmissionBatch
+
+
+def random_solution(seed: int) -> str:
+    r = random.Random(seed)
+    lines = [f"class Solution{seed}:", "    def solve(self, nums, k):"]
+    for i in range(12):
+        terms = " + ".join(f"nums[{r.randint(0, 9)}] * {r.randint(1, 99)}" for _ in range(r.randint(2, 4)))
+        lines.append(f"        x{i} = {terms}")
+        lines.append(f"        while x{i} > {r.randint(1, 50)}: x{i} //= {r.randint(2, 5)}")
+    lines.append("        return " + " ^ ".join(f"x{i}" for i in range(12)))
+    return "\n".join(lines) + "\n"
+
+
+class Contest:
+    def __init__(self):
+        self.next_id = 0
+
+    def batch(self, codes: List[str]) -> SubmissionBatch:
+        submissions = []
+        for code in codes:
+            self.next_id += 1
+            submissions.append(
+                {
+                    "id": self.next_id,
+                    "code": code,
+                    "language": "python3",
+                    "date": self.next_id,
+                    "userSlug": f"user{self.next_id}",
+                    "page": 1,
+                    "questionId": 1,
+                }
+            )
+        return SubmissionBatch.from_dicts(submissions)
+
+
+def test_posts_grown_and_merged_groups_again(monkeypatch):
+    monkeypatch.setattr(PARAMETERS, "SIMILARITY_THRESHOLD", 0.4)
+    detector = IncrementalDetector(Question(id=1, name="q"), "python3", DetectorRun(id=5))
+    contest = Contest()
+    first, second = random_solution(1), random_solution(2)
+
+    posts = [detector.add_submissions(contest.batch([first] * 4 + [random_solution(3)]))]
+    posts.append(detector.add_submissions(contest.batch([first])))
+    posts.append(detector.add_submissions(contest.batch([second] * 4)))
+    posts.append(detector.add_submissions(contest.batch([random_solution(4)])))
+    # copied from both, so it joins the two posted groups
+    posts.append(detector.add_submissions(contest.batch([first + second])))
+
+    groups = [[sorted(plagiarism.submission_ids) for plagiarism in plagiarisms] for plagiarisms in posts]
+    assert groups == [
+        [[1, 2, 3, 4]],
+        [[1, 2, 3, 4, 6]],
+        [[7, 8, 9, 10]],
+        [],
+        [[1, 2, 3, 4, 6, 7, 8, 9, 10, 12]],
+    ]
+    assert all(plagiarism.detector_run_id == 5 for plagiarisms in posts for plagiarism in plagiarisms)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from processing.copydetect.metrics import StageRecorder, format_summary
+
+
+def test_records_the_peak_of_memory_freed_within_the_stage():
+    recorder = StageRecorder("q", "python3")
+    with recorder.stage("compare") as record:
+        block = np.ones(64 * 2**20, dtype=np.uint8)
+        del block
+    if record["peak_scope"] != "stage":
+        pytest.skip("the rss high-water mark cannot be reset here")
+
+    assert record["rss_peak_delta_mb"] >= 60
+    assert not record["overlapped"]
+
+
+def test_marks_stages_running_at_the_same_time():
+    fetches, groups = StageRecorder("q", None), StageRecorder("q", "python3")
+    with fetches.stage("fetch"):
+        with groups.stage("compare"):
+            pass
+    with groups.stage("cluster"):
+        pass
+
+    assert [record["overlapped"] for record in fetches.records + groups.records] == [True, True, False]
+    assert "overlapped" in format_summary(fetches.records + groups.records)
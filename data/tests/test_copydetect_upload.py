@@ -0,0 +1,56 @@
+from typing import List
+
+import httpx
+import pytest
+from api_client import Client
+from api_client.models.plagiarism_dto import PlagiarismDTO
+from processing.copydetect import upload
+from processing.copydetect.upload import PlagiarismUploader
+
+
+def upload_with(monkeypatch, failures: List, replace: bool = False):
+    # every request takes the next failure (an exception or a status), then succeeds
+    monkeypatch.setattr(upload, "UPLOAD_BACKOFF_SECONDS", 0)
+    requests = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append(request.method)
+        failure = failures.pop(0) if failures else 200
+        if isinstance(failure, Exception):
+            raise failure
+        return httpx.Response(failure)
+
+    client = Client(base_url="http://api", httpx_args={"transport": httpx.MockTransport(handle)})
+    uploader = PlagiarismUploader(client, max_retries=3, replace=replace)
+    uploader.submit(
+        [PlagiarismDTO(confidence_percentage=90, submission_ids=[1, 2, 3, 4], detector_run_id=5, language="python3")]
+    )
+    return uploader.close(), requests
+
+
+@pytest.mark.parametrize(
+    "failure", [httpx.ConnectError("refused"), httpx.ConnectTimeout("connect timed out"), 429, 503]
+)
+def test_retries_when_the_groups_were_not_stored(monkeypatch, failure):
+    summary, requests = upload_with(monkeypatch, [failure, failure])
+
+    assert requests == ["POST"] * 3
+    assert summary["chunks"] == 1 and summary["retries"] == 2
+
+
+@pytest.mark.parametrize(
+    "failure", [httpx.ReadTimeout("read timed out"), httpx.RemoteProtocolError("closed"), 500, 502]
+)
+def test_does_not_add_groups_again_when_they_may_be_stored(monkeypatch, failure):
+    summary, requests = upload_with(monkeypatch, [failure])
+
+    assert requests == ["POST"]
+    assert summary["failed_chunks"] == 1 and summary["retries"] == 0
+
+
+@pytest.mark.parametrize("failure", [httpx.ReadTimeout("read timed out"), 500])
+def test_retries_replacing_after_any_error(monkeypatch, failure):
+    summary, requests = upload_with(monkeypatch, [failure], replace=True)
+
+    assert requests == ["PUT", "PUT"]
+    assert summary["chunks"] == 1
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from scraping.submissions import engine
+from scraping.submissions.engine import AIMDLimiter, AsyncScraper, FetchError
+
+
+class StandInServer(ThreadingHTTPServer):
+    # Local stand-in for the LeetCode endpoints: /ok/<n> answers {"n": n}, /flaky/<name>/<k> fails its first k
+    # requests with a 503, /throttled always answers 429. It counts connections, requests and requests in flight.
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests: Counter = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: StandInServer
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests[self.path] += 1
+            count = self.server.requests[self.path]
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        try:
+            time.sleep(0.02)
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+        parts = self.path.strip("/").split("/")
+        if parts[0] == "ok":
+            self.respond(200, {"n": int(parts[1])})
+        elif parts[0] == "flaky":
+            self.respond(503 if count <= int(parts[2]) else 200, {"attempt": count})
+        elif parts[0] == "throttled":
+            self.respond(429, {})
+        else:
+            self.respond(404, {})
+
+    def respond(self, status: int, body: dict):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+@pytest.fixture
+def server():
+    server = StandInServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    # the bounds of every backoff, without sleeping for them
+    calls = []
+
+    def randint(low, high):
+        calls.append((low, high))
+        return 0
+
+    monkeypatch.setattr(engine, "randint", randint)
+    return calls
+
+
+def create_scraper(concurrency: int, max_retries: int = 3) -> AsyncScraper:
+    limiter = AIMDLimiter(initial=concurrency, minimum=1, maximum=concurrency, latency_target=5)
+    return AsyncScraper({"accept": "application/json"}, limiter, max_retries=max_retries, timeout=5)
+
+
+def test_reuses_keep_alive_connections(server):
+    async def scrape():
+        async with create_scraper(concurrency=4) as scraper:
+            return await asyncio.gather(*[scraper.get(f"{server.url}/ok/{i}") for i in range(40)])
+
+    responses = asyncio.run(scrape())
+
+    assert [response["n"] for response in responses] == list(range(40))
+    assert server.connections <= 4
+
+
+def test_caps_requests_in_flight(server):
+    async def scrape():
+        async with create_scraper(concurrency=3) as scraper:
+            await asyncio.gather(*[scraper.get(f"{server.url}/ok/{i}") for i in range(30)])
+
+    asyncio.run(scrape())
+
+    assert server.max_in_flight == 3
+
+
+def test_retries_error_statuses_with_exponential_backoff(server, backoffs):
+    async def scrape():
+        async with create_scraper(concurrency=2, max_retries=5) as scraper:
+            return await scraper.get(f"{server.url}/flaky/a/3")
+
+    response = asyncio.run(scrape())
+
+    assert response == {"attempt": 4}
+    assert server.requests["/flaky/a/3"] == 4
+    assert backoffs == [(1, 1), (1, 2), (1, 4)]
+
+
+def test_raises_fetch_error_after_max_retries(server, backoffs):
+    async def scrape(scraper: AsyncScraper):
+        async with scraper:
+            await scraper.get(f"{server.url}/throttled")
+
+    scraper = create_scraper(concurrency=4, max_retries=3)
+    with pytest.raises(FetchError):
+        asyncio.run(scrape(scraper))
+
+    assert server.requests["/throttled"] == 3
+    assert len(backoffs) == 3
+    assert scraper.limiter.summary["failed"] == 3
+    assert scraper.limiter.window < 4
+
+
+def test_limiter_grows_on_fast_successes_and_halves_on_failures():
+    async def run():
+        limiter = AIMDLimiter(initial=4, minimum=1, maximum=6, latency_target=5)
+        for _ in range(20):
+            async with limiter.slot():
+                pass
+        grown = limiter.window
+        with pytest.raises(RuntimeError):
+            async with limiter.slot():
+                raise RuntimeError("429")
+        return grown, limiter.window
+
+    grown, shrunk = asyncio.run(run())
+
+    assert grown == 6
+    assert shrunk == 3
@@ -0,0 +1,57 @@
+import json
+import random
+
+import pytest
+from processing.utils import iter_json_array
+
+DOCUMENT = json.dumps(
+    [
+        {"id": 1, "code": 'print("a, b]")\n\\t', "date": 1.5e9, "page": -3, "questionId": None},
+        {"id": 22, "code": "ünïcödé ✓", "nested": [[], {}, [1, [2.25, -0.5e-3]]], "flag": True},
+        12345678901234567890,
+        -1.25e-10,
+        "",
+        False,
+        None,
+    ]
+)
+
+
+def split(text: str, boundaries):
+    boundaries = [0, *sorted(boundaries), len(text)]
+    return [text[start:end] for start, end in zip(boundaries, boundaries[1:])]
+
+
+@pytest.mark.parametrize(
+    "chunks, expected",
+    [
+        (["[1.", "5]"], [1.5]),
+        (["[1", "2, 3", "4]"], [12, 34]),
+        (["[1e", "5, 2E-", "3, 4.5e", "+2]"], [1e5, 2e-3, 450.0]),
+        (["[-", "1, tr", "ue, nu", "ll, fal", "se]"], [-1, True, None, False]),
+        (['["a\\', '"b", "\\u00', 'e9"]'], ['a"b', "é"]),
+        (["", " [", "", "1 ", " ,2", "] ", "\n"], [1, 2]),
+        ([" [ ] "], []),
+    ],
+)
+def test_decodes_elements_split_across_chunks(chunks, expected):
+    assert list(iter_json_array(chunks)) == expected
+
+
+def test_decodes_random_splits_like_json_loads():
+    r = random.Random(0)
+    expected = json.loads(DOCUMENT)
+    for _ in range(500):
+        boundaries = [r.randint(0, len(DOCUMENT)) for _ in range(r.randint(1, 30))]
+        assert list(iter_json_array(split(DOCUMENT, boundaries))) == expected
+    # one character at a time
+    assert list(iter_json_array(DOCUMENT)) == expected
+
+
+@pytest.mark.parametrize(
+    "text", ["[1 2]", "[1,,2]", "[,1]", "[1,]", "[1]x", "[1] [2]", "[1", "[1,", "", "{}", "[1x]", "[tru]"]
+)
+def test_rejects_malformed_arrays(text):
+    for chunks in ([text], list(text)):
+        with pytest.raises(ValueError):
+            list(iter_json_array(chunks))